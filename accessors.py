@@ -0,0 +1,156 @@
+from pygltflib import GLTF2, Accessor, BufferView
+import os
+import numpy as np
+
+# Datové typy komponent accessorů (componentType -> numpy dtype)
+COMPONENT_DTYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+
+# Počet komponent podle typu accessoru
+TYPE_SIZES = {
+    "SCALAR": 1,
+    "VEC2": 2,
+    "VEC3": 3,
+    "VEC4": 4,
+    "MAT2": 4,
+    "MAT3": 9,
+    "MAT4": 16,
+}
+
+def get_buffer_bytes(gltf: GLTF2, buffer_index):
+    """
+    Vrátí binární data bufferu (GLB blob, data URI nebo externí .bin soubor).
+    """
+    buffer = gltf.buffers[buffer_index]
+    if buffer.uri is None:
+        return gltf.binary_blob()
+    if buffer.uri.startswith("data"):
+        return gltf.decode_data_uri(buffer.uri)
+    with open(os.path.join(getattr(gltf, "_path", ""), buffer.uri), "rb") as f:
+        return f.read()
+
+def _read_view(gltf: GLTF2, buffer_view_index, byte_offset, dtype, count, components, buffers):
+    buffer_view = gltf.bufferViews[buffer_view_index]
+    if buffer_view.buffer not in buffers:
+        buffers[buffer_view.buffer] = get_buffer_bytes(gltf, buffer_view.buffer)
+    data = buffers[buffer_view.buffer]
+
+    item_size = np.dtype(dtype).itemsize * components
+    stride = buffer_view.byteStride or item_size
+    start = (buffer_view.byteOffset or 0) + (byte_offset or 0)
+
+    if count == 0:
+        return np.zeros((0, components), dtype=dtype)
+
+    # Prokládaná data (byteStride) se čtou jako pohled na řádky o délce stride
+    raw = np.frombuffer(data, dtype=np.uint8, count=(count - 1) * stride + item_size, offset=start)
+    if stride == item_size:
+        return raw.view(dtype).reshape(count, components)
+    rows = np.lib.stride_tricks.as_strided(raw, shape=(count, item_size), strides=(stride, 1))
+    return np.ascontiguousarray(rows).view(dtype).reshape(count, components)
+
+def read_accessor(gltf: GLTF2, accessor_index, normalize = True, buffers = None):
+    """
+    Načte data accessoru do numpy pole tvaru (count, počet komponent).
+
+    :param gltf: GLTF objekt.
+    :param accessor_index: Index accessoru.
+    :param normalize: Převést normalizované celočíselné hodnoty na float (podle glTF specifikace).
+    :param buffers: Volitelná cache binárních dat bufferů (buffer index -> data).
+    """
+    if buffers is None:
+        buffers = {}
+
+    accessor = gltf.accessors[accessor_index]
+    dtype = COMPONENT_DTYPES[accessor.componentType]
+    components = TYPE_SIZES[accessor.type]
+
+    if accessor.bufferView is not None:
+        values = _read_view(gltf, accessor.bufferView, accessor.byteOffset, dtype, accessor.count, components, buffers)
+    else:
+        values = np.zeros((accessor.count, components), dtype=dtype)
+
+    # Sparse accessor přepisuje jen vybrané prvky
+    if accessor.sparse:
+        sparse = accessor.sparse
+        indices = _read_view(gltf, sparse.indices.bufferView, sparse.indices.byteOffset,
+                             COMPONENT_DTYPES[sparse.indices.componentType], sparse.count, 1, buffers)
+        sparse_values = _read_view(gltf, sparse.values.bufferView, sparse.values.byteOffset,
+                                   dtype, sparse.count, components, buffers)
+        values = values.copy()
+        values[indices[:, 0]] = sparse_values
+
+    if normalize and accessor.normalized:
+        values = dequantize(values)
+
+    return values
+
+def dequantize(values):
+    """
+    Převede normalizované celočíselné hodnoty na float podle glTF specifikace.
+    """
+    info = np.iinfo(values.dtype)
+    if info.min < 0:
+        return np.maximum(values.astype(np.float32) / info.max, -1.0)
+    return values.astype(np.float32) / info.max
+
+# componentType podle numpy dtype
+DTYPE_COMPONENTS = {np.dtype(dtype): component for component, dtype in COMPONENT_DTYPES.items()}
+
+# Název typu accessoru podle počtu komponent (pro vrcholová data)
+COMPONENT_TYPES = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}
+
+def add_accessor(gltf: GLTF2, blob: bytearray, values, normalized = False, target = None, byte_stride = None, min_max = False):
+    """
+    Připojí data na konec bufferu jako nový bufferView a accessor.
+
+    :param gltf: GLTF objekt (data se zapisují do bufferu 0).
+    :param blob: Binární data bufferu 0, do kterých se připojuje (bytearray).
+    :param values: Numpy pole tvaru (count, počet komponent) nebo (count,).
+    :param normalized: Příznak normalized accessoru.
+    :param target: Cíl bufferView (34962 vrcholy, 34963 indexy).
+    :param byte_stride: Rozteč prvků v bajtech (např. 8 pro VEC3 int16 - zarovnání na 4 bajty).
+    :param min_max: Uložit min/max (povinné pro POSITION).
+    :return: Index nového accessoru.
+    """
+    values = np.ascontiguousarray(values)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    count, components = values.shape
+    item_size = values.dtype.itemsize * components
+
+    data = values.view(np.uint8).reshape(count, item_size)
+    if byte_stride is not None and byte_stride > item_size:
+        padded = np.zeros((count, byte_stride), dtype=np.uint8)
+        padded[:, :item_size] = data
+        data = padded
+
+    blob.extend(b"\0" * (-len(blob) % 4))
+    gltf.bufferViews.append(BufferView(
+        buffer=0,
+        byteOffset=len(blob),
+        byteLength=data.nbytes,
+        byteStride=byte_stride if byte_stride and byte_stride > item_size else None,
+        target=target,
+    ))
+    blob.extend(data.tobytes())
+
+    accessor = Accessor(
+        bufferView=len(gltf.bufferViews) - 1,
+        componentType=DTYPE_COMPONENTS[values.dtype],
+        normalized=normalized or None,
+        count=count,
+        type=COMPONENT_TYPES[components],
+    )
+    if min_max and count:
+        accessor.min = values.min(axis=0).tolist()
+        accessor.max = values.max(axis=0).tolist()
+    gltf.accessors.append(accessor)
+
+    return len(gltf.accessors) - 1
@@ -1,45 +1,140 @@
-# pip install azure-storage-blob
-from azure.storage.blob import BlobServiceClient
+# pip install azure-storage-blob aiohttp
+import asyncio
+import random
 from urllib.parse import quote
 
 # Nastavte připojovací řetězec a název kontejneru
+# (pro lokální testy lze použít emulátor Azurite: "UseDevelopmentStorage=true")
 CONNECTION_STRING = ""
 CONTAINER_NAME = "production"
 FOLDER_PATH = "venly/models/"  # Například "my-folder/"
 
-# Inicializace klienta blob služby
-blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
-container_client = blob_service_client.get_container_client(CONTAINER_NAME)
+# Maximální počet souběžných požadavků
+MAX_CONCURRENCY = 32
+
+# Opakování přechodných chyb s exponenciálním čekáním
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+def create_container_client(connection_string = CONNECTION_STRING, container_name = CONTAINER_NAME):
+    """
+    Vytvoří asynchronního klienta kontejneru (azure.storage.blob.aio).
+    """
+    from azure.storage.blob.aio import ContainerClient
+    return ContainerClient.from_connection_string(connection_string, container_name)
+
+def get_content_disposition(blob_name):
+    """
+    Vrátí hodnotu Content-Disposition pro stažení souboru pod jeho názvem.
+    """
+    file_name = blob_name.split('/')[-1]  # Extrahování názvu souboru
+    return f"attachment; filename=\"{quote(file_name)}\""
+
+def _is_transient(error):
+    # Chyby, u kterých má smysl požadavek opakovat (přetížení, výpadek spojení)
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in TRANSIENT_STATUS_CODES
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in ("ServiceRequestError", "ServiceResponseError")
+
+async def with_retry(operation, retries = MAX_RETRIES, base_delay = RETRY_BASE_DELAY):
+    """
+    Spustí asynchronní operaci a při přechodné chybě ji opakuje s exponenciálním čekáním
+    (s náhodným rozptylem, aby se souběžné požadavky nesynchronizovaly).
+
+    :param operation: Funkce bez parametrů vracející awaitable.
+    :param retries: Maximální počet opakování.
+    :param base_delay: Čekání před prvním opakováním v sekundách.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == retries or not _is_transient(e):
+                raise
+            await asyncio.sleep(base_delay * 2 ** attempt * (0.5 + random.random()))
+
+async def _update_blob(container_client, blob):
+    blob_client = container_client.get_blob_client(blob.name)
+
+    # Hlavičky ze seznamu blobů - set_http_headers nahrazuje všechny, ostatní se tedy zachovají
+    content_settings = blob.content_settings
+    content_settings.content_disposition = get_content_disposition(blob.name)
 
-def set_content_disposition_for_blobs():
     try:
-        # Procházejte všechny bloby ve specifikované složce
-        blobs = container_client.list_blobs(name_starts_with=FOLDER_PATH)
-        for blob in blobs:
-            blob_client = container_client.get_blob_client(blob.name)
-            
-            # Získání stávajících metadat a hlaviček
-            blob_properties = blob_client.get_blob_properties()
-            current_disposition = blob_properties.content_settings.content_disposition
+        # Zápis jen pokud se blob od výpisu nezměnil (jinak by se přepsaly novější hlavičky)
+        await with_retry(lambda: blob_client.set_http_headers(content_settings=content_settings, if_match=blob.etag))
+        return True
+    except Exception as e:
+        if getattr(e, "status_code", None) != 412:
+            raise
+
+    # Blob se mezitím změnil - načtení aktuálních vlastností a nový pokus
+    blob_properties = await with_retry(blob_client.get_blob_properties)
+    content_settings = blob_properties.content_settings
+    if content_settings.content_disposition:
+        return False
+    content_settings.content_disposition = get_content_disposition(blob.name)
+    await with_retry(lambda: blob_client.set_http_headers(content_settings=content_settings, if_match=blob_properties.etag))
+    return True
 
+async def set_content_disposition_for_blobs(container_client = None, folder_path = FOLDER_PATH, max_concurrency = MAX_CONCURRENCY):
+    """
+    Nastaví Content-Disposition všem blobům ve složce, které ho ještě nemají.
+
+    Bloby se přeskakují podle údajů z výpisu (list_blobs vrací content_settings), takže se
+    vlastnosti jednotlivých blobů nenačítají. Aktualizace běží souběžně, počet rozpracovaných
+    požadavků je omezený max_concurrency (výpis se při plném limitu pozastaví).
+
+    :param container_client: Asynchronní klient kontejneru (výchozí create_container_client()).
+                             Lze předat klienta pro emulátor Azurite nebo testovací náhradu.
+    :param folder_path: Prefix názvů blobů.
+    :param max_concurrency: Maximální počet souběžných požadavků.
+    :return: Slovník s počty aktualizovaných, přeskočených a chybných blobů.
+    """
+    own_client = container_client is None
+    if own_client:
+        container_client = create_container_client()
+
+    stats = {"updated": 0, "skipped": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = set()
+
+    async def update(blob):
+        try:
+            if await _update_blob(container_client, blob):
+                stats["updated"] += 1
+                print(f"Updated Content-Disposition for blob: {blob.name}")
+            else:
+                stats["skipped"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"An error occurred for blob {blob.name}: {e}")
+        finally:
+            semaphore.release()
+
+    try:
+        # Procházejte všechny bloby ve specifikované složce
+        async for blob in container_client.list_blobs(name_starts_with=folder_path):
             # Přeskočení, pokud Content-Disposition již existuje
-            if current_disposition:
-                print(f"Skipping blob (Content-Disposition already set): {blob.name}")
+            if blob.content_settings.content_disposition:
+                stats["skipped"] += 1
                 continue
 
-            # Vytvořte Content-Disposition hodnotu
-            file_name = blob.name.split('/')[-1]  # Extrahování názvu souboru
-            content_disposition = f"attachment; filename=\"{quote(file_name)}\""
-            
-            new_headers = blob_properties.content_settings
-            new_headers.content_disposition = content_disposition
-            
-            # Aktualizace hlaviček blobu
-            blob_client.set_http_headers(content_settings=new_headers)
-            print(f"Updated Content-Disposition for blob: {blob.name}")
+            await semaphore.acquire()
+            task = asyncio.create_task(update(blob))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        await asyncio.gather(*tasks)
+    finally:
+        if own_client:
+            await container_client.close()
+
+    print(f"Content-Disposition: updated {stats['updated']}, skipped {stats['skipped']}, failed {stats['failed']}.")
+
+    return stats
 
 if __name__ == "__main__":
-    set_content_disposition_for_blobs()
\ No newline at end of file
+    asyncio.run(set_content_disposition_for_blobs())
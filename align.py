@@ -1,36 +1,119 @@
 from pygltflib import GLTF2
 import numpy as np
-import trimesh
 
-from split import trs_to_matrix
+from accessors import read_accessor
+from glb_io import load_glb, save_glb
+from instancing import get_instance_matrices
+from transforms import get_scene_nodes, get_world_matrices, matrix_to_list, trs_to_matrix
 
 def get_bbox(glb_path):
 
-    # Načtení GLB modelu pomocí trimesh bez textur
-    scene_or_mesh = trimesh.load(glb_path, skip_materials=True, process=False)
+    # Načtení GLB souboru
+    gltf = load_glb(glb_path)
 
-    # Pokud je načtený objekt scénou, extrahujeme hlavní mesh s transformacemi
-    if isinstance(scene_or_mesh, trimesh.Scene):
-        scene_or_mesh = scene_or_mesh.dump(concatenate=True)
+    return get_gltf_bbox(gltf)
 
-    # Výpočet bounding boxu a nastavení kamery tak, aby objekt fitnul do záběru
-    bounding_box = scene_or_mesh.bounding_box.bounds
+def _box_corners(box_min, box_max):
+    # 8 rohů kvádru v homogenních souřadnicích
+    corners = np.array(np.meshgrid([0, 1], [0, 1], [0, 1], indexing="ij")).reshape(3, -1).T
+    points = np.where(corners == 0, box_min, box_max)
+    return np.hstack([points, np.ones((8, 1))])
 
-    # print(np.round(bounding_box, 2))
+def get_gltf_bbox(gltf: GLTF2):
+    """
+    Vypočte bounding box již načteného GLTF objektu bez trimesh.
 
-    return bounding_box
+    Používá min/max POSITION accessorů: rohy AABB každé primitivy se transformují světovými
+    maticemi všech instancí meshe najednou. Pouze instance s rotací mimo osy (kde by rohy
+    AABB box zvětšily) a accessory bez min/max se počítají z vrcholů. Instance
+    EXT_mesh_gpu_instancing se započítají jako samostatné uzly.
 
-def align_glb_to_center(input_path, output_path = None, align_to = [0, 0, 0]):
+    :param gltf: GLTF objekt.
+    :return: Pole [[min x, min y, min z], [max x, max y, max z]].
+    """
+    world = get_world_matrices(gltf)
 
-    # Načtení GLB souboru
-    gltf = GLTF2().load(input_path)
+    buffers = {}
+
+    # Instance meshů - světové matice uzlů scény (a jejich GPU instancí) pro každý mesh
+    instances = {}
+    for node_index in get_scene_nodes(gltf):
+        node = gltf.nodes[node_index]
+        if node.mesh is not None:
+            instance_matrices = get_instance_matrices(gltf, node, buffers)
+            matrices = world[node_index][np.newaxis] if instance_matrices is None else np.matmul(world[node_index], instance_matrices)
+            instances.setdefault(node.mesh, []).append(matrices)
+
+    box_min = np.full(3, np.inf)
+    box_max = np.full(3, -np.inf)
+
+    for mesh_index, node_matrices in instances.items():
+        matrices = np.concatenate(node_matrices)
+
+        # Rotace je "v osách", pokud má každý řádek 3x3 části jen jeden nenulový prvek
+        linear = matrices[:, :3, :3]
+        axis_aligned = (np.count_nonzero(np.abs(linear) > 1e-9, axis=2) <= 1).all(axis=1)
+
+        for primitive in gltf.meshes[mesh_index].primitives:
+            position = getattr(primitive.attributes, "POSITION", None)
+            if position is None:
+                continue
+            accessor = gltf.accessors[position]
+
+            vertices = None
+            if accessor.min and accessor.max and not accessor.normalized:
+                primitive_min, primitive_max = np.array(accessor.min), np.array(accessor.max)
+            else:
+                vertices = read_accessor(gltf, position, buffers=buffers).astype(np.float64)
+                if len(vertices) == 0:
+                    continue
+                primitive_min, primitive_max = vertices.min(axis=0), vertices.max(axis=0)
+
+            # Transformace rohů AABB pro všechny instance najednou
+            if axis_aligned.any():
+                corners = _box_corners(primitive_min, primitive_max)
+                points = np.einsum("nij,kj->nki", matrices[axis_aligned], corners)[:, :, :3]
+                box_min = np.minimum(box_min, points.min(axis=(0, 1)))
+                box_max = np.maximum(box_max, points.max(axis=(0, 1)))
+
+            # Ostatní instance - přesný výpočet z vrcholů
+            if not axis_aligned.all():
+                if vertices is None:
+                    vertices = read_accessor(gltf, position, buffers=buffers).astype(np.float64)
+                for matrix in matrices[~axis_aligned]:
+                    points = np.dot(vertices, matrix[:3, :3].T) + matrix[:3, 3]
+                    box_min = np.minimum(box_min, points.min(axis=0))
+                    box_max = np.maximum(box_max, points.max(axis=0))
+
+    return np.array([box_min, box_max])
+
+def save_size(path, size, align_to):
+    """
+    Uloží rozměry modelu a způsob zarovnání do textového souboru.
+    """
+    with open(path, "w") as f:
+        f.writelines([
+            "Size:     ",
+            str(size),
+            "\n",
+            "Align to: ",
+            str(align_to)
+        ])
+
+def align_gltf_to_center(gltf: GLTF2, align_to = [0, 0, 0]):
+    """
+    Zarovná načtený GLTF objekt do počátku (v paměti, bez ukládání).
+
+    :param gltf: GLTF objekt.
+    :param align_to: Zarovnání v jednotlivých osách (-1 = max, 0 = střed, 1 = min).
+    :return: Rozměry modelu, nebo None pokud soubor neobsahuje geometrii.
+    """
 
     # check is geometry is present
     if len(gltf.scenes[0].nodes) == 0 or gltf.scenes[0].nodes[0] is None or not any([node.mesh is not None for node in gltf.nodes]):
-        print(f"No geometry found in the GLB file '{input_path}'.")
-        return
+        return None
 
-    bbox = get_bbox(input_path)
+    bbox = get_gltf_bbox(gltf)
 
     # Výpočet středu ve všech osách (průměr souřadnic)
     center = (bbox[0] + bbox[1]) / 2
@@ -38,16 +121,6 @@ def align_glb_to_center(input_path, output_path = None, align_to = [0, 0, 0]):
     size = bbox[1] - bbox[0]
     print("Size: " + str(np.round(size,4)))
 
-    # Uložit size do souboru
-    with open(input_path.replace(".glb", "_size.txt"), "w") as f:
-        f.writelines([
-            "Size:     ",
-            str(size),
-            "\n",
-            "Align to: ",
-            str(align_to)
-        ])
-
     if align_to[0] == 1:
         center[0] = bbox[0][0]
     elif align_to[0] == -1:
@@ -64,23 +137,36 @@ def align_glb_to_center(input_path, output_path = None, align_to = [0, 0, 0]):
         center[2] = bbox[1][2]
 
     global_transformation = trs_to_matrix(translation=-center)
+    world = get_world_matrices(gltf)
 
     # Aktualizace transformace root uzlu pro zarovnání do počátku
     for node_index in gltf.scenes[0].nodes:
         node = gltf.nodes[node_index]
-        current_matrix = np.transpose(np.array(node.matrix).reshape(4, 4)) if node.matrix else trs_to_matrix(
-            node.translation or [0, 0, 0],
-            node.rotation or [0, 0, 0, 1],
-            node.scale or [1, 1, 1],
-        )
-        transformed = np.dot(global_transformation, current_matrix)
-        node.matrix = np.transpose(transformed).flatten().tolist()
+        transformed = np.dot(global_transformation, world[node_index])
+        node.matrix = matrix_to_list(transformed)
+        node.translation, node.rotation, node.scale = None, None, None
+
+    return size
+
+def align_glb_to_center(input_path, output_path = None, align_to = [0, 0, 0]):
+
+    # Načtení GLB souboru
+    gltf = load_glb(input_path)
+
+    size = align_gltf_to_center(gltf, align_to)
+
+    if size is None:
+        print(f"No geometry found in the GLB file '{input_path}'.")
+        return
+
+    # Uložit size do souboru
+    save_size(input_path.replace(".glb", "_size.txt"), size, align_to)
 
     # Uložení zarovnaného GLB souboru
     if output_path is None:
         output_path = input_path.replace(".glb", "_aligned.glb")
 
-    gltf.save(output_path)
+    save_glb(gltf, output_path)
 
     return output_path
 
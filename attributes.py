@@ -1,13 +1,85 @@
 from pygltflib import GLTF2
+from fnmatch import fnmatchcase
 
+from glb_io import load_glb, save_glb
+from optimize import collect_garbage, get_texture_infos
 
-def remove_normals(gltf: GLTF2):
-    for mesh in gltf.meshes:
+# Atributy, které mají v pygltflib.Attributes vlastní pole (nastavují se na None, ostatní se mažou)
+STANDARD_ATTRIBUTES = ("POSITION", "NORMAL", "TANGENT", "TEXCOORD_0", "TEXCOORD_1", "COLOR_0", "JOINTS_0", "WEIGHTS_0")
+
+# Atributy, které nepoužíváme (statické modely bez vertex colors a druhé sady UV)
+UNUSED_ATTRIBUTES = ("NORMAL", "TANGENT", "COLOR_*", "TEXCOORD_[1-9]*", "JOINTS_*", "WEIGHTS_*")
+
+
+def _matches(name, patterns):
+    return any(fnmatchcase(name, pattern) for pattern in patterns)
+
+def _remove_attribute(attributes, name):
+    if name in STANDARD_ATTRIBUTES:
+        setattr(attributes, name, None)
+    else:
+        delattr(attributes, name)
+
+def strip_attributes(gltf: GLTF2, keep = None, drop = None, compact = True):
+    """
+    Odstraní vrcholové atributy podle pravidel a uvolní jejich data.
+
+    Pravidla jsou vzory názvů atributů (fnmatch), např. "NORMAL", "COLOR_*", "TEXCOORD_[1-9]*".
+    Atribut se odstraní, pokud neodpovídá žádnému vzoru z keep (je-li zadán) nebo odpovídá
+    některému vzoru z drop. Stejné atributy se odstraní i z morph targets.
+
+    Nikdy se neodstraní POSITION, texturovací souřadnice použité materiálem primitivy
+    (texCoord) a JOINTS/WEIGHTS meshů, které používá skinovaný uzel.
+
+    Nepoužité accessors a bufferViews se hned odstraní pomocí collect_garbage.
+
+    :param gltf: GLTF objekt.
+    :param keep: Vzory atributů, které se ponechají (None = všechny).
+    :param drop: Vzory atributů, které se odstraní.
+    :param compact: Zkopírovat zbývající data do nového kompaktního bufferu (viz collect_garbage).
+                    Bez toho vynechá uvolněné úseky až uložení.
+    :return: Slovník název atributu -> počet primitiv, ze kterých byl odstraněn.
+    """
+    skinned_meshes = {node.mesh for node in gltf.nodes if node.mesh is not None and node.skin is not None}
+
+    removed = {}
+    for mesh_index, mesh in enumerate(gltf.meshes):
         for primitive in mesh.primitives:
-            if primitive.attributes.NORMAL:
-                del primitive.attributes.NORMAL
-            if primitive.attributes.TANGENT:
-                del primitive.attributes.TANGENT
+            protected = {"POSITION"}
+            if primitive.material is not None:
+                for info in get_texture_infos(gltf.materials[primitive.material]):
+                    tex_coord = info.get("texCoord") if isinstance(info, dict) else info.texCoord
+                    protected.add(f"TEXCOORD_{tex_coord or 0}")
+            if mesh_index in skinned_meshes:
+                protected.update(name for name in primitive.attributes.__dict__ if name.startswith(("JOINTS_", "WEIGHTS_")))
+
+            for name, value in list(primitive.attributes.__dict__.items()):
+                if value is None or name in protected:
+                    continue
+                if (keep is not None and not _matches(name, keep)) or (drop and _matches(name, drop)):
+                    _remove_attribute(primitive.attributes, name)
+                    removed[name] = removed.get(name, 0) + 1
+
+                    for target in primitive.targets or []:
+                        if isinstance(target, dict):
+                            target.pop(name, None)
+                        elif getattr(target, name, None) is not None:
+                            _remove_attribute(target, name)
+
+    if removed:
+        # Uvolnění accessorů, bufferViews a dat odstraněných atributů
+        collect_garbage(gltf, compact=compact)
+
+        print(f"Odstraněné atributy: {', '.join(f'{name} ({count}x)' for name, count in sorted(removed.items()))}.")
+
+    return removed
+
+
+def remove_normals(gltf: GLTF2, compact = True):
+    """
+    Odstraní normály a tangenty včetně jejich dat (viz strip_attributes).
+    """
+    strip_attributes(gltf, drop=["NORMAL", "TANGENT"], compact=compact)
     return gltf
 
 
@@ -16,13 +88,13 @@ def test():
     path = r"D:\femcad\Venly\GLB\output\RegularDoors_10152024_01\RegularDoors_10152024_01_level1-1.glb"
 
     # Načtení GLB souboru
-    gltf = GLTF2().load(path)
+    gltf = load_glb(path)
 
     remove_normals(gltf)
 
     new_path = path.replace('.glb', '_no_normals.glb')
 
-    gltf.save(new_path)
+    save_glb(gltf, new_path)
 
 if __name__ == "__main__":
     test()
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from align import align_glb_to_center
+from glb_io import load_glb, save_glb
+from instancing import instance_meshes
+from optimize import clean_gltf, deduplicate_geometry, optimize_buffers, optimize_indices
+from split import split_glb_by_root_nodes
+from synthetic import generate
+from texture import process_images_in_gltf
+
+# Parametry syntetické scény pro jednotlivé velikosti (viz synthetic.generate)
+SCALES = {
+    "small": dict(roots=4, depth=3, children=3, meshes=4, segments=8, duplicates=1, textures=2, texture_size=256),
+    "medium": dict(roots=8, depth=4, children=3, meshes=8, segments=32, duplicates=2, textures=4, texture_size=1024),
+    "large": dict(roots=16, depth=5, children=3, meshes=16, segments=96, duplicates=3, textures=8, texture_size=2048),
+}
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Zpomalení menší než MIN_REGRESSION_S se nehlásí (šum u velmi rychlých kroků)
+MIN_REGRESSION_S = 0.005
+
+def _file_stages(work_dir):
+    # Kroky pracující se soubory: funkce(cesta ke vstupnímu GLB)
+    return {
+        "split_glb_by_root_nodes": lambda path: split_glb_by_root_nodes(path, os.path.join(work_dir, "split"), "part"),
+        "align_glb_to_center": lambda path: align_glb_to_center(path, os.path.join(work_dir, "aligned.glb"), [0, 1, 0]),
+    }
+
+# Kroky pracující s GLTF objektem v paměti
+MEMORY_STAGES = {
+    "clean_gltf": clean_gltf,
+    "optimize_buffers": optimize_buffers,
+    "deduplicate_geometry": deduplicate_geometry,
+    "optimize_indices": optimize_indices,
+    "instance_meshes": instance_meshes,
+    "process_images_in_gltf": process_images_in_gltf,
+}
+
+def run_benchmark(scale = "small", repeat = 3, stages = None):
+    """
+    Vygeneruje syntetickou scénu zadané velikosti a změří jednotlivé kroky zpracování.
+
+    Každý krok se spustí repeat-krát vždy na čerstvě načteném souboru (načtení se neměří).
+
+    :param scale: Velikost scény (klíč SCALES).
+    :param repeat: Počet opakování každého kroku.
+    :param stages: Volitelný seznam měřených kroků (výchozí všechny).
+    :return: Slovník krok -> {"min_s", "median_s"}.
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_path = os.path.join(work_dir, "synthetic.glb")
+        save_glb(generate(**SCALES[scale]), input_path)
+        print(f"Scéna '{scale}': {os.path.getsize(input_path) / (1024 * 1024):.1f} MB")
+
+        measured = {name: (stage, True) for name, stage in _file_stages(work_dir).items()}
+        measured.update({name: (stage, False) for name, stage in MEMORY_STAGES.items()})
+
+        for name, (stage, file_based) in measured.items():
+            if stages and name not in stages:
+                continue
+
+            times = []
+            for _ in range(repeat):
+                gltf = None if file_based else load_glb(input_path)
+                start = time.perf_counter()
+                stage(input_path if file_based else gltf)
+                times.append(time.perf_counter() - start)
+
+            results[name] = {"min_s": round(min(times), 4), "median_s": round(statistics.median(times), 4)}
+            print(f"{name}: {results[name]['min_s']:.4f} s")
+
+    return results
+
+def load_baseline(path = BASELINE_PATH):
+    """
+    Načte uložené výsledky (velikost -> krok -> výsledek), nebo prázdný slovník.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(scale, results, path = BASELINE_PATH):
+    """
+    Uloží výsledky jako referenční pro danou velikost scény.
+    """
+    baseline = load_baseline(path)
+    baseline[scale] = results
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+
+def compare(results, baseline, tolerance = 1.3):
+    """
+    Porovná výsledky s referenčními (podle nejkratšího času).
+
+    :param results: Výsledky run_benchmark.
+    :param baseline: Referenční výsledky pro stejnou velikost scény.
+    :param tolerance: Povolený poměr času vůči referenci.
+    :return: Seznam kroků, které jsou pomalejší než tolerance.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<24} {result['min_s']:>9.4f} s   (bez reference)")
+            continue
+        reference = baseline[name]["min_s"]
+        ratio = result["min_s"] / reference if reference else float("inf")
+        slower = ratio > tolerance and result["min_s"] - reference > MIN_REGRESSION_S
+        print(f"{name:<24} {result['min_s']:>9.4f} s   reference {reference:.4f} s   {ratio:5.2f}x{'   ZPOMALENÍ' if slower else ''}")
+        if slower:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark kroků zpracování GLB na syntetické scéně.")
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stage", action="append", help="Měřit jen zadaný krok (lze opakovat).")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Soubor s referenčními výsledky.")
+    parser.add_argument("--save-baseline", action="store_true", help="Uložit výsledky jako referenční.")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="Povolený poměr času vůči referenci.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.scale, args.repeat, args.stage)
+
+    if args.save_baseline:
+        save_baseline(args.scale, results, args.baseline)
+        print(f"Reference uložena do {args.baseline}")
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline).get(args.scale)
+    if baseline is None:
+        print(f"Reference pro '{args.scale}' neexistuje (spusťte s --save-baseline).")
+        sys.exit(0)
+
+    regressions = compare(results, baseline, args.tolerance)
+    sys.exit(1 if regressions else 0)
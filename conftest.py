@@ -0,0 +1,132 @@
+import copy
+import itertools
+
+import pytest
+
+
+class FakeHttpError(Exception):
+    """Chyba služby s HTTP stavovým kódem (jako azure.core.exceptions.HttpResponseError)."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeContentSettings:
+    """Náhrada azure.storage.blob.ContentSettings."""
+
+    def __init__(self, content_type = None, content_disposition = None, content_md5 = None):
+        self.content_type = content_type
+        self.content_disposition = content_disposition
+        self.content_md5 = content_md5
+
+
+class FakeBlobProperties:
+    """Vlastnosti blobu tak, jak je vrací list_blobs a get_blob_properties (kopie, ne živý stav)."""
+
+    def __init__(self, name, content_settings, etag):
+        self.name = name
+        self.content_settings = copy.copy(content_settings)
+        self.etag = etag
+
+
+class FakeBlobClient:
+
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+
+    async def get_blob_properties(self):
+        self.container.calls["get_blob_properties"] += 1
+        self.container.fail("get_blob_properties", self.name)
+        blob = self.container.blobs[self.name]
+        return FakeBlobProperties(self.name, blob["content_settings"], blob["etag"])
+
+    async def set_http_headers(self, content_settings, if_match = None):
+        self.container.calls["set_http_headers"] += 1
+        self.container.fail("set_http_headers", self.name)
+        blob = self.container.blobs[self.name]
+        if if_match is not None and if_match != blob["etag"]:
+            raise FakeHttpError(412)
+        self.container.write(self.name, content_settings=content_settings)
+
+    async def upload_blob(self, data, overwrite = False, content_settings = None, max_concurrency = 1):
+        self.container.calls["upload_blob"] += 1
+        self.container.fail("upload_blob", self.name)
+        data = data.read() if hasattr(data, "read") else bytes(data)
+        if self.name not in self.container.blobs:
+            self.container.blobs[self.name] = {}
+        elif not overwrite:
+            raise FakeHttpError(409)
+        self.container.write(self.name, data=data, content_settings=content_settings or FakeContentSettings())
+
+
+class FakeContainerClient:
+    """
+    Asynchronní náhrada azure.storage.blob.aio.ContainerClient v paměti.
+
+    - failures: (operace, název blobu) -> seznam stavových kódů, které vrátí další volání.
+    - concurrent_updates: název blobu -> nastavení, které "jiný klient" zapíše hned po výpisu
+      blobu (list_blobs pak vrací zastaralý etag).
+    """
+
+    def __init__(self):
+        self.blobs = {}
+        self.failures = {}
+        self.concurrent_updates = {}
+        self.calls = {"get_blob_properties": 0, "set_http_headers": 0, "upload_blob": 0}
+        self.closed = False
+        self._etags = itertools.count(1)
+
+    def add_blob(self, name, data = b"", **content_settings):
+        self.blobs[name] = {"data": data}
+        self.write(name, content_settings=FakeContentSettings(**content_settings))
+
+    def write(self, name, data = None, content_settings = None):
+        blob = self.blobs[name]
+        if data is not None:
+            blob["data"] = data
+        if content_settings is not None:
+            blob["content_settings"] = copy.copy(content_settings)
+        blob["etag"] = f"etag-{next(self._etags)}"
+
+    def fail(self, operation, name):
+        codes = self.failures.get((operation, name))
+        if codes:
+            raise FakeHttpError(codes.pop(0))
+
+    async def list_blobs(self, name_starts_with = None):
+        for name in sorted(self.blobs):
+            if name_starts_with and not name.startswith(name_starts_with):
+                continue
+            blob = self.blobs[name]
+            snapshot = FakeBlobProperties(name, blob["content_settings"], blob["etag"])
+            if name in self.concurrent_updates:
+                self.write(name, content_settings=self.concurrent_updates.pop(name))
+            yield snapshot
+
+    def get_blob_client(self, name):
+        return FakeBlobClient(self, name)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def container():
+    return FakeContainerClient()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Čekání mezi opakováními se nečeká, jen zaznamená (seznam délek v sekundách)."""
+    import asyncio
+    delays = []
+    original_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await original_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    return delays
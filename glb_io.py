@@ -0,0 +1,196 @@
+from pygltflib import GLTF2, Asset, Buffer
+from contextlib import contextmanager
+from pathlib import Path
+import mmap
+import os
+import struct
+
+from accessors import get_buffer_bytes
+
+GLB_MAGIC = b"glTF"
+GLB_VERSION = 2
+CHUNK_JSON = b"JSON"
+CHUNK_BIN = b"BIN\0"
+
+def load_glb(path):
+    """
+    Načte GLB soubor bez kopírování binárních dat.
+
+    Soubor se namapuje do paměti (mmap), z JSON chunku se sestaví GLTF objekt a BIN chunk
+    se nastaví jako binární blob ve formě memoryview nad mapovaným souborem. Data se tak
+    načítají až při přístupu a stránky může systém kdykoli uvolnit. Blob je pouze pro čtení -
+    úpravy vždy vytváří nová data (set_binary_blob).
+
+    Mapování se uvolní voláním close_glb (nebo použitím open_glb), jinak až garbage collectorem.
+    Dokud je soubor namapovaný, nelze ho na Windows přepsat ani smazat.
+
+    Soubory .gltf se načtou standardně přes GLTF2.load.
+
+    :param path: Cesta ke GLB souboru.
+    :return: GLTF objekt.
+    """
+    if Path(path).suffix.lower() != ".glb":
+        return GLTF2().load(path)
+
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+
+    magic, version, length = struct.unpack_from("<4sII", view, 0)
+    if magic != GLB_MAGIC:
+        raise IOError(f"Soubor {path} není platný GLB.")
+
+    gltf = None
+    blob = None
+    index = 12
+    while index < length:
+        chunk_length, chunk_type = struct.unpack_from("<I4s", view, index)
+        index += 8
+        if chunk_type == CHUNK_JSON:
+            gltf = GLTF2.gltf_from_json(bytes(view[index:index + chunk_length]).decode("utf-8"))
+        elif chunk_type == CHUNK_BIN:
+            blob = view[index:index + chunk_length]
+        index += chunk_length
+
+    gltf.set_binary_blob(blob)
+    gltf._path = Path(path).parent
+    gltf._name = Path(path).name
+    gltf._mapping = (mapping, view)
+
+    return gltf
+
+def close_glb(gltf: GLTF2):
+    """
+    Uvolní mapování souboru načteného pomocí load_glb. Binární data GLTF objektu pak už nejsou
+    k dispozici (části a kopie vytvořené z objektu mají data vlastní).
+
+    Pokud na mapovaná data ještě odkazují jiné objekty (např. memoryview z get_buffer_view_data),
+    mapování zůstane až do jejich uvolnění garbage collectorem.
+
+    :param gltf: GLTF objekt.
+    :return: True, pokud bylo mapování uvolněno (nebo objekt žádné neměl).
+    """
+    mapped = getattr(gltf, "_mapping", None)
+    if mapped is None:
+        return True
+    mapping, view = mapped
+    blob = gltf.binary_blob()
+    gltf._mapping = None
+    gltf.set_binary_blob(None)
+
+    try:
+        if isinstance(blob, memoryview):
+            blob.release()
+        view.release()
+        mapping.close()
+    except BufferError:
+        return False
+    return True
+
+@contextmanager
+def open_glb(path):
+    """
+    Načte GLB soubor (load_glb) a po opuštění bloku with uvolní jeho mapování (close_glb).
+
+    Použití:
+        with open_glb(path) as gltf:
+            ...
+    """
+    gltf = load_glb(path)
+    try:
+        yield gltf
+    finally:
+        close_glb(gltf)
+
+def get_buffer_view_data(gltf: GLTF2, buffer_view_index, buffers = None):
+    """
+    Vrátí data bufferView jako memoryview bez kopírování.
+
+    :param gltf: GLTF objekt.
+    :param buffer_view_index: Index bufferView.
+    :param buffers: Volitelná cache binárních dat bufferů (buffer index -> memoryview).
+    """
+    if buffers is None:
+        buffers = {}
+    buffer_view = gltf.bufferViews[buffer_view_index]
+    if buffer_view.buffer not in buffers:
+        buffers[buffer_view.buffer] = memoryview(get_buffer_bytes(gltf, buffer_view.buffer))
+    start = buffer_view.byteOffset or 0
+    return buffers[buffer_view.buffer][start:start + buffer_view.byteLength]
+
+def write_glb(gltf: GLTF2, f):
+    """
+    Zapíše GLTF objekt jako GLB do otevřeného souboru bez sestavování binárních dat v paměti.
+
+    Použité bufferViews se rozmístí do jednoho BIN chunku (zarovnání na 4 bajty, stejné úseky
+    se sdílí), JSON se serializuje s novým rozložením a do souboru se postupně zapíší jen
+    úseky dat, na které bufferViews odkazují. Nepoužitá data mezi nimi se vynechají.
+    GLTF objekt zůstane beze změny.
+
+    :param gltf: GLTF objekt.
+    :param f: Binární soubor otevřený pro zápis (nebo io.BytesIO).
+    """
+    # Rozložení BIN chunku
+    buffers = {}
+    layout = {}
+    ranges = []
+    offset = 0
+    original_views = [(buffer_view.buffer, buffer_view.byteOffset) for buffer_view in gltf.bufferViews]
+    for index, buffer_view in enumerate(gltf.bufferViews):
+        start = buffer_view.byteOffset or 0
+        key = (buffer_view.buffer, start, buffer_view.byteLength)
+        if key not in layout:
+            offset += -offset % 4
+            layout[key] = offset
+            ranges.append((get_buffer_view_data(gltf, index, buffers), offset))
+            offset += buffer_view.byteLength
+    bin_length = offset + (-offset % 4)
+
+    original_buffers = gltf.buffers
+    if gltf.asset is None:
+        gltf.asset = Asset()
+    try:
+        for buffer_view in gltf.bufferViews:
+            buffer_view.byteOffset = layout[(buffer_view.buffer, buffer_view.byteOffset or 0, buffer_view.byteLength)]
+            buffer_view.buffer = 0
+        gltf.buffers = [Buffer(byteLength=bin_length)] if bin_length else []
+        json_blob = gltf.gltf_to_json(separators=(",", ":"), indent=None).encode("utf-8")
+    finally:
+        gltf.buffers = original_buffers
+        for buffer_view, (buffer, byte_offset) in zip(gltf.bufferViews, original_views):
+            buffer_view.buffer = buffer
+            buffer_view.byteOffset = byte_offset
+
+    json_blob += b" " * (-len(json_blob) % 4)
+    length = 12 + 8 + len(json_blob) + (8 + bin_length if bin_length else 0)
+
+    f.write(struct.pack("<4sII", GLB_MAGIC, GLB_VERSION, length))
+    f.write(struct.pack("<I4s", len(json_blob), CHUNK_JSON))
+    f.write(json_blob)
+
+    if bin_length:
+        f.write(struct.pack("<I4s", bin_length, CHUNK_BIN))
+        position = 0
+        for data, new_offset in ranges:
+            f.write(b"\0" * (new_offset - position))
+            f.write(data)
+            position = new_offset + len(data)
+        f.write(b"\0" * (bin_length - position))
+
+def save_glb(gltf: GLTF2, path):
+    """
+    Uloží GLTF objekt jako GLB (viz write_glb).
+
+    Zápis probíhá přes dočasný soubor, cílový soubor se nahradí až po úplném zápisu.
+    Soubor, který je stále namapovaný (load_glb bez close_glb), nelze na Windows nahradit -
+    výstup z namapovaného GLTF objektu proto ukládejte do jiného souboru.
+
+    :param gltf: GLTF objekt.
+    :param path: Cesta k výstupnímu GLB souboru.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        write_glb(gltf, f)
+    os.replace(temp_path, path)
+
+    return True
@@ -3,83 +3,186 @@ import trimesh
 import pyrender
 import numpy as np
 from PIL import Image
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pygltflib import GLTF2
+import io
+import queue
+import threading
 import sys
 import os
 
-def generate_thumbnail(glb_path, output_path, width=400, height=300):
+from glb_io import write_glb
+
+# Směry kamery (od středu modelu ke kameře)
+CAMERA_DIRECTIONS = {
+    "front": (0.0, 0.0, 1.0),
+    "side": (1.0, 0.0, 0.0),
+    "top": (0.0, 1.0, 0.0),
+    "iso": (1.0, 0.8, 1.0),
+}
+
+@dataclass
+class ThumbnailView:
+    """
+    Jeden náhled scény.
+
+    :param width: Šířka v pixelech.
+    :param height: Výška v pixelech.
+    :param pose: Směr kamery (klíč CAMERA_DIRECTIONS).
+    :param suffix: Přípona názvu souboru (náhled s prázdnou příponou se uloží do output_path).
+    """
+    width: int = 512
+    height: int = 512
+    pose: str = "side"
+    suffix: str = ""
+
+def _load_trimesh(source, skip_materials):
+    # Zdroj: cesta ke GLB, GLTF objekt v paměti nebo trimesh scéna / mesh
+    if isinstance(source, (trimesh.Scene, trimesh.Trimesh)):
+        return source
+    if isinstance(source, GLTF2):
+        data = io.BytesIO()
+        write_glb(source, data)
+        data.seek(0)
+        return trimesh.load(data, file_type="glb", skip_materials=skip_materials, process=False)
+    return trimesh.load(source, skip_materials=skip_materials, process=False)
+
+def _camera_pose(centroid, radius, direction, yfov, aspect):
+    # Kamera ve vzdálenosti, kdy se obalová koule modelu vejde do záběru (pyrender kamera hledí ve směru -z)
+    fov = min(yfov, 2 * np.arctan(np.tan(yfov / 2) * aspect))
+    z_axis = np.array(direction, dtype=np.float64)
+    z_axis /= np.linalg.norm(z_axis)
+    up = np.array([0.0, 0.0, -1.0]) if abs(z_axis[1]) > 0.999 else np.array([0.0, 1.0, 0.0])
+    x_axis = np.cross(up, z_axis)
+    x_axis /= np.linalg.norm(x_axis)
+    y_axis = np.cross(z_axis, x_axis)
+
+    pose = np.identity(4)
+    pose[:3, 0], pose[:3, 1], pose[:3, 2] = x_axis, y_axis, z_axis
+    pose[:3, 3] = centroid + z_axis * (radius / np.sin(fov / 2))
+    return pose
+
+class ThumbnailWorker:
+    """
+    Dlouhodobě běžící generátor náhledů.
+
+    Vlastní vlákno drží jeden pyrender.OffscreenRenderer (OpenGL kontext je vázaný na vlákno)
+    a postupně zpracovává frontu GLB souborů nebo scén v paměti. Každá scéna se načte jednou
+    a vyrenderuje se ve všech zadaných velikostech a pohledech. Pro renderování na CPU bez
+    displeje je třeba před importem nastavit PYOPENGL_PLATFORM=osmesa.
+
+    Použití:
+        with ThumbnailWorker([ThumbnailView(512, 512), ThumbnailView(128, 128, "iso", "_small")]) as worker:
+            future = worker.submit("model.glb")
+            paths = future.result()
+    """
+
+    def __init__(self, views = None, skip_materials = True, max_queue = 0):
+        """
+        :param views: Výchozí seznam ThumbnailView (výchozí je jeden náhled 512x512 z boku).
+        :param skip_materials: Načítat modely bez materiálů a textur.
+        :param max_queue: Maximální délka fronty (0 = bez omezení).
+        """
+        self.views = views or [ThumbnailView()]
+        self.skip_materials = skip_materials
+        self._queue = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, name="ThumbnailWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, source, output_path = None, views = None) -> Future:
+        """
+        Zařadí scénu do fronty.
+
+        :param source: Cesta ke GLB, GLTF objekt nebo trimesh scéna.
+        :param output_path: Cesta k PNG (výchozí je cesta ke GLB s příponou .png).
+        :param views: Seznam ThumbnailView (výchozí self.views).
+        :return: Future se seznamem uložených souborů.
+        """
+        if output_path is None:
+            if not isinstance(source, str):
+                raise ValueError("Pro scénu v paměti je nutné zadat output_path.")
+            output_path = os.path.splitext(source)[0] + '.png'
+
+        future = Future()
+        self._queue.put((future, source, output_path, views or self.views))
+        return future
+
+    def close(self):
+        """Dokončí frontu a ukončí vlákno (uvolní OpenGL kontext)."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        renderer = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                future, source, output_path, views = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if renderer is None:
+                        renderer = pyrender.OffscreenRenderer(viewport_width=views[0].width, viewport_height=views[0].height)
+                    future.set_result(self._render(renderer, source, output_path, views))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            if renderer is not None:
+                renderer.delete()
+
+    def _render(self, renderer, source, output_path, views):
+        scene_or_mesh = _load_trimesh(source, self.skip_materials)
+
+        # Pokud je načtený objekt scénou, extrahujeme meshe s transformacemi
+        if isinstance(scene_or_mesh, trimesh.Scene):
+            scene_or_mesh = scene_or_mesh.dump(concatenate=False)
+
+        scene = pyrender.Scene(bg_color=[255, 255, 255, 255])  # Bílá barva pozadí
+        mesh = pyrender.Mesh.from_trimesh(scene_or_mesh)
+        scene.add(mesh)
+
+        # Obalová koule modelu pro nastavení kamery
+        centroid = (mesh.bounds[0] + mesh.bounds[1]) / 2.0
+        radius = max(np.linalg.norm(mesh.bounds[1] - mesh.bounds[0]) / 2.0, 1e-6)
+
+        camera = pyrender.PerspectiveCamera(yfov=np.pi / 3.0)
+        camera_node = scene.add(camera)
+        light_node = scene.add(pyrender.DirectionalLight(color=np.ones(3), intensity=5.0))
+
+        base, ext = os.path.splitext(output_path)
+        paths = []
+        for view in views:
+            pose = _camera_pose(centroid, radius, CAMERA_DIRECTIONS[view.pose], camera.yfov, view.width / view.height)
+            scene.set_pose(camera_node, pose)
+            scene.set_pose(light_node, pose)
+
+            renderer.viewport_width = view.width
+            renderer.viewport_height = view.height
+            color, _ = renderer.render(scene)
+
+            path = base + view.suffix + ext
+            Image.fromarray(color).save(path)
+            paths.append(path)
+            print(f'Náhled byl uložen do: {path}')
+
+        return paths
 
-    # Načtení GLB modelu pomocí trimesh bez textur
-    scene_or_mesh = trimesh.load(glb_path, skip_materials=True, process=False)
-    # scene_or_mesh.show()
-
-    # return
-
-    # Pokud je načtený objekt scénou, extrahujeme hlavní mesh s transformacemi
-    if isinstance(scene_or_mesh, trimesh.Scene):
-        scene_or_mesh = scene_or_mesh.dump(concatenate=False)
-
-    # Vytvoření scény pro renderování
-    scene = pyrender.Scene(bg_color=[255, 255, 255, 255])  # Bílá barva pozadí
-
-    # Vytvoření jednoduchého materiálu
-    material = pyrender.MetallicRoughnessMaterial(
-        metallicFactor=0.2,
-        roughnessFactor=0.8,
-        baseColorFactor=[1.0, 0.5, 0.3, 1.0]
-    )
-
-    mesh = pyrender.Mesh.from_trimesh(scene_or_mesh)#, material=material)
-    scene.add(mesh)
-
-    # Výpočet bounding boxu a nastavení kamery tak, aby objekt fitnul do záběru
-    bounding_box = mesh.bounds
-    centroid = (bounding_box[0] + bounding_box[1]) / 2.0
-    extents = bounding_box[1] - bounding_box[0]
-    distance = max(extents) * 2.5
-    print(f'Centroid: {centroid}, Extents: {extents}, Distance: {distance}')
-
-    # Nastavení ortogonální kamery zepředu
-    # camera = pyrender.PerspectiveCamera(xmag=extents[0] * 1.5, ymag=extents[1] * 1.5)
-    camera = pyrender.PerspectiveCamera(yfov=np.pi / 3.0)
-    # camera = pyrender.OrthographicCamera(xmag=extents[0] * 1.5, ymag=extents[2] * 1.5)
-    camera_pose_top = np.array([
-        [1.0, 0.0, 0.0, centroid[0]],
-        [0.0, 1.0, 0.0, centroid[1]+5],
-        [0.0, 0.0, 1.0, centroid[2] + distance/2.5],
-        [0.0, 0.0, 0.0, 1.0],
-    ])
-    camera_pose_side = np.array([
-        [0.0, 0.0, 1.0, centroid[0] + distance/2.5],
-        [0.0, 1.0, 0.0, centroid[1]],
-        [-1.0, 0.0, 0.0, centroid[2]],
-        [0.0, 0.0, 0.0, 1.0],
-    ])
-    scene.add(camera, pose=camera_pose_side)
-
-    # Nastavení světla
-    light = pyrender.DirectionalLight(color=np.ones(3), intensity=5.0)
-    light_pose = np.array([
-        [1.0, 0.0, 0.0, centroid[0]],
-        [0.0, 1.0, 0.0, centroid[1] + distance * 1.5],
-        [0.0, 0.0, 1.0, centroid[2] + distance * 1.5],
-        [0.0, 0.0, 0.0, 1.0],
-    ])
-    scene.add(light, pose=light_pose)
-
-
-    # Renderování scény
-    renderer = pyrender.OffscreenRenderer(viewport_width=width, viewport_height=height)
-    color, _ = renderer.render(scene)
-
-    # Uložení obrázku
-    image = Image.fromarray(color)
-    if (output_path is None):
-        output_path = os.path.splitext(glb_path)[0] + '.png'
-    image.save(output_path)
-    print(f'Náhled byl uložen do: {output_path}')
-
-    # Uvolnění prostředků
-    renderer.delete()
+def generate_thumbnail(glb_path, output_path, width=400, height=300):
+    """
+    Vytvoří jeden náhled GLB souboru. Pro více souborů je výhodnější ThumbnailWorker,
+    který kontext rendereru vytváří jen jednou.
+    """
+    with ThumbnailWorker([ThumbnailView(width, height, "side")]) as worker:
+        return worker.submit(glb_path, output_path).result()[0]
 
 
 def call_thumbnail_generator(glb_path, output_path, width=512, height=512):
@@ -0,0 +1,161 @@
+from pygltflib import GLTF2, Buffer, Node
+import sys
+import numpy as np
+
+from accessors import add_accessor, read_accessor
+from glb_io import load_glb, save_glb
+from optimize import INSTANCING_EXTENSION, collect_garbage
+from transforms import get_scene_nodes, get_world_matrices, matrices_to_trs, trs_to_matrices
+
+# Minimální počet uzlů se stejným meshem, od kterého se mesh vykreslí pomocí instancí
+MIN_INSTANCES = 8
+
+# Zrcadlení v ose x - transformace uzlu se zrcadlenými instancemi
+MIRROR = np.diag([-1.0, 1.0, 1.0, 1.0])
+
+def _animated_nodes(gltf: GLTF2):
+    # Uzly, jejichž světová transformace se mění animací (cíle kanálů a jejich potomci)
+    stack = [channel.target.node for animation in gltf.animations for channel in animation.channels if channel.target.node is not None]
+    animated = set()
+    while stack:
+        node_index = stack.pop()
+        if node_index not in animated:
+            animated.add(node_index)
+            stack.extend(gltf.nodes[node_index].children)
+    return animated
+
+def get_instance_matrices(gltf: GLTF2, node: Node, buffers = None):
+    """
+    Vrátí transformační matice instancí uzlu (EXT_mesh_gpu_instancing).
+
+    :param gltf: GLTF objekt.
+    :param node: Uzel.
+    :param buffers: Volitelná cache dat bufferů (viz read_accessor).
+    :return: Pole tvaru (počet instancí, 4, 4) relativně k uzlu, nebo None pokud uzel instance nemá.
+    """
+    extension = (node.extensions or {}).get(INSTANCING_EXTENSION)
+    attributes = extension.get("attributes") if isinstance(extension, dict) else None
+    if not attributes:
+        return None
+
+    values = {name: read_accessor(gltf, attributes[name], buffers=buffers) for name in ("TRANSLATION", "ROTATION", "SCALE") if attributes.get(name) is not None}
+    if not values:
+        return None
+    count = len(next(iter(values.values())))
+
+    return trs_to_matrices(
+        values.get("TRANSLATION", np.zeros((count, 3))),
+        values.get("ROTATION", np.tile([0.0, 0.0, 0.0, 1.0], (count, 1))),
+        values.get("SCALE", np.ones((count, 3))),
+    )
+
+def instance_meshes(gltf: GLTF2, min_instances = MIN_INSTANCES, scene_index = None):
+    """
+    Nahradí opakované uzly se stejným meshem jedním uzlem s rozšířením EXT_mesh_gpu_instancing.
+
+    Uzly scény se seskupí podle meshe (mesh určuje i sadu materiálů, identické meshe sloučí
+    deduplicate_geometry). Pro skupiny s alespoň min_instances uzly se světové matice uzlů
+    rozloží najednou na translation / rotation / scale a uloží jako atributy instancí nového
+    kořenového uzlu scény. Původní uzly o mesh přijdou a prázdné uzly odstraní collect_garbage.
+
+    Vynechají se skinované uzly, uzly s vlastními vahami morph targets, animované uzly
+    a uzly, jejichž matici nelze rozložit na TRS (zkosení).
+
+    Prohlížeče určují orientaci trojúhelníků (winding) podle transformace uzlu, ne instance.
+    Zrcadlené uzly (záporný determinant) proto dostanou vlastní uzel se zrcadlením v ose x
+    (scale [-1, 1, 1]) a jejich instance mají kladná měřítka. Skupina zrcadlených uzlů menší
+    než min_instances zůstane beze změny.
+
+    Původní uzly nezůstávají jako
+    záložní varianta, rozšíření se proto uvádí v extensionsUsed i extensionsRequired
+    (prohlížeč bez jeho podpory soubor nenačte).
+
+    :param gltf: GLTF objekt (GLB s jedním bufferem).
+    :param min_instances: Minimální počet uzlů se stejným meshem.
+    :param scene_index: Index scény (výchozí gltf.scene, případně 0).
+    :return: Slovník s počtem instancovaných meshes a nahrazených uzlů.
+    """
+    if scene_index is None:
+        scene_index = gltf.scene or 0
+
+    animated = _animated_nodes(gltf)
+    world = get_world_matrices(gltf)
+
+    groups = {}
+    for node_index in get_scene_nodes(gltf, scene_index):
+        node = gltf.nodes[node_index]
+        if node.mesh is None or node.skin is not None or getattr(node, "weights", None) or node_index in animated:
+            continue
+        if INSTANCING_EXTENSION in (node.extensions or {}):
+            continue
+        groups.setdefault(node.mesh, []).append(node_index)
+
+    blob = bytearray(gltf.binary_blob() or b"")
+    stats = {"meshes": 0, "nodes": 0}
+
+    for mesh_index, node_indices in groups.items():
+        if len(node_indices) < min_instances:
+            continue
+
+        node_indices = np.array(node_indices)
+        mirrored = np.linalg.det(world[node_indices][:, :3, :3]) < 0
+
+        for mirror in (False, True):
+            # Instance zrcadleného uzlu: MIRROR * instance = světová matice (MIRROR je sám sobě inverzí)
+            matrices = world[node_indices[mirrored == mirror]]
+            if mirror:
+                matrices = np.matmul(MIRROR, matrices)
+
+            (translations, rotations, scales), valid = matrices_to_trs(matrices)
+            if np.count_nonzero(valid) < min_instances:
+                continue
+
+            # Výchozí rotace a měřítko se neukládají
+            attributes = {"TRANSLATION": add_accessor(gltf, blob, translations[valid].astype(np.float32))}
+            if not np.allclose(rotations[valid], [0, 0, 0, 1]):
+                attributes["ROTATION"] = add_accessor(gltf, blob, rotations[valid].astype(np.float32))
+            if not np.allclose(scales[valid], 1):
+                attributes["SCALE"] = add_accessor(gltf, blob, scales[valid].astype(np.float32))
+
+            gltf.nodes.append(Node(
+                name=(gltf.meshes[mesh_index].name or f"mesh{mesh_index}") + ("_instances_mirrored" if mirror else "_instances"),
+                mesh=mesh_index,
+                scale=[-1.0, 1.0, 1.0] if mirror else None,
+                extensions={INSTANCING_EXTENSION: {"attributes": attributes}},
+            ))
+            gltf.scenes[scene_index].nodes.append(len(gltf.nodes) - 1)
+
+            for node_index in node_indices[mirrored == mirror][valid]:
+                gltf.nodes[node_index].mesh = None
+
+            stats["meshes"] += 1
+            stats["nodes"] += int(np.count_nonzero(valid))
+
+    if not stats["meshes"]:
+        return stats
+
+    if not gltf.buffers:
+        gltf.buffers.append(Buffer())
+    gltf.buffers[0].byteLength = len(blob)
+    gltf.set_binary_blob(blob)
+
+    for extensions in (gltf.extensionsUsed, gltf.extensionsRequired):
+        if INSTANCING_EXTENSION not in extensions:
+            extensions.append(INSTANCING_EXTENSION)
+
+    # Odstranění uzlů, které po přesunu meshe zůstaly prázdné
+    collect_garbage(gltf, compact=False)
+
+    print(f"Instancování: {stats['meshes']} meshes, nahrazeno {stats['nodes']} uzlů.")
+
+    return stats
+
+
+if __name__ == "__main__":
+
+    input_path = sys.argv[1]
+    output_path = (len(sys.argv) > 2 and sys.argv[2]) or input_path.replace(".glb", "_instanced.glb")
+
+    gltf = load_glb(input_path)
+    instance_meshes(gltf)
+    save_glb(gltf, output_path)
@@ -0,0 +1,200 @@
+from contextlib import contextmanager
+import cProfile
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+REPORT_FIELDS = ["part", "stage", "wall_s", "cpu_s", "traced_peak_mb", "rss_start_mb", "rss_peak_mb", "input_bytes", "output_bytes"]
+
+MB = 1024 * 1024
+
+def current_rss_mb():
+    """
+    Vrátí aktuální RSS procesu v MB (None, pokud ho nelze zjistit).
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / MB
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def reset_peak_rss():
+    """
+    Vynuluje maximum RSS procesu, takže peak_rss_mb pak vrací maximum od tohoto okamžiku.
+    Funguje jen na Linuxu (/proc/self/clear_refs), jinde vrací False.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """
+    Vrátí maximální RSS procesu v MB od spuštění, případně od posledního reset_peak_rss
+    (None, pokud ho nelze zjistit).
+    """
+    try:
+        # VmHWM (na rozdíl od ru_maxrss) respektuje reset_peak_rss
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux vrací kB, macOS bajty
+        return peak / MB if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / MB
+    return None
+
+def _stage_peak_rss(peak_reset, peak_start, rss_start):
+    # Maximum RSS během kroku. Přesné, pokud šlo maximum procesu na začátku kroku vynulovat
+    # nebo ho krok zvýšil. Jinak (Windows, macOS) se vrátí jen dolní odhad z aktuálního RSS
+    # na začátku a konci kroku - maximum procesu z dřívějších částí by ho zkreslilo.
+    peak_end = peak_rss_mb()
+    if peak_end is None:
+        return None
+    if peak_reset or peak_start is None or peak_end > peak_start:
+        return round(peak_end, 1)
+    values = [value for value in (rss_start, current_rss_mb()) if value is not None]
+    return round(max(values), 1) if values else None
+
+class Instrumentation:
+    """
+    Měření jednotlivých kroků zpracování.
+
+    Pro každý krok (stage) a část (part) se zaznamená čas (wall, CPU), RSS na začátku kroku
+    a maximální RSS během kroku, volitelně špička alokací Pythonu a numpy (tracemalloc) a velikost vstupních a výstupních dat.
+    Volitelně se každý krok profiluje pomocí cProfile a uloží do profile_dir.
+
+    Instance obsahuje jen nastavení a seznam záznamů, lze ji tedy předávat do podřízených procesů
+    (viz child) a záznamy z nich sloučit pomocí extend.
+    """
+
+    def __init__(self, enabled = True, trace_memory = False, profile_dir = None, part = None):
+        """
+        :param enabled: Vypnutá instance nic neměří (pro volání bez měření).
+        :param trace_memory: Měřit špičku alokací pomocí tracemalloc (výrazně zpomaluje).
+        :param profile_dir: Složka pro výstupy cProfile (None = bez profilování).
+        :param part: Název části, ke které se záznamy vztahují.
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.part = part
+        self.records = []
+
+    def child(self, part):
+        """
+        Vrátí novou instanci se stejným nastavením pro zadanou část (bez záznamů).
+        """
+        return Instrumentation(self.enabled, self.trace_memory, self.profile_dir, part)
+
+    def extend(self, records):
+        """
+        Přidá záznamy (např. z podřízeného procesu).
+        """
+        self.records.extend(records)
+
+    @contextmanager
+    def stage(self, name, input_bytes = None):
+        """
+        Změří krok zpracování. Vrací záznam (slovník), do kterého lze doplnit output_bytes.
+
+        Použití:
+            with instrument.stage("images", input_bytes=size) as record:
+                ...
+                record["output_bytes"] = new_size
+        """
+        record = {"part": self.part, "stage": name, "input_bytes": input_bytes, "output_bytes": None}
+        if not self.enabled:
+            yield record
+            return
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        profiler = None
+        if self.profile_dir is not None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        # Maximum RSS procesu je jen jedno, kroky se proto nesmí vnořovat
+        peak_reset = reset_peak_rss()
+        peak_start = peak_rss_mb()
+        rss_start = current_rss_mb()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall_start, 4)
+            record["cpu_s"] = round(time.process_time() - cpu_start, 4)
+
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                part = str(self.part or "main").replace("/", "_").replace("\\", "_")
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{part}-{name}.prof"))
+
+            record["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2) if self.trace_memory else None
+            record["rss_start_mb"] = round(rss_start, 1) if rss_start is not None else None
+            record["rss_peak_mb"] = _stage_peak_rss(peak_reset, peak_start, rss_start)
+
+            self.records.append(record)
+
+    def summary(self):
+        """
+        Vrátí součty času a dat podle kroků.
+        """
+        summary = {}
+        for record in self.records:
+            stage = summary.setdefault(record["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "input_bytes": 0, "output_bytes": 0})
+            stage["count"] += 1
+            stage["wall_s"] = round(stage["wall_s"] + record["wall_s"], 4)
+            stage["cpu_s"] = round(stage["cpu_s"] + record["cpu_s"], 4)
+            stage["input_bytes"] += record["input_bytes"] or 0
+            stage["output_bytes"] += record["output_bytes"] or 0
+        return summary
+
+    def write_report(self, path):
+        """
+        Uloží záznamy jako JSON (včetně souhrnu podle kroků) a CSV.
+
+        :param path: Cesta bez přípony (uloží se path.json a path.csv).
+        :return: Dvojice cest (JSON, CSV).
+        """
+        json_path = path + ".json"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "records": self.records}, f, indent=1)
+
+        csv_path = path + ".csv"
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records)
+
+        return json_path, csv_path
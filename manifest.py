@@ -0,0 +1,110 @@
+from dataclasses import asdict, is_dataclass
+from pygltflib import GLTF2
+import hashlib
+import json
+import os
+
+from glb_io import write_glb
+
+def hash_file(path, chunk_size = 1024 * 1024):
+    """
+    Vrátí SHA-256 obsahu souboru (čte se po blocích).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class _HashWriter:
+    # Souborový objekt, který zapisovaná data jen hashuje
+    def __init__(self):
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return len(data)
+
+def hash_gltf(gltf: GLTF2):
+    """
+    Vrátí SHA-256 GLTF objektu v paměti (GLB tak, jak by se uložil, bez sestavení v paměti).
+    """
+    writer = _HashWriter()
+    write_glb(gltf, writer)
+    return writer.digest.hexdigest()
+
+def _params_value(value):
+    if is_dataclass(value):
+        return asdict(value)
+    return str(value)
+
+def stage_key(input_hash, **params):
+    """
+    Vrátí klíč kroku sestavení z hashe vstupu a parametrů kroku.
+    """
+    data = json.dumps({"input": input_hash, "params": params}, sort_keys=True, default=_params_value)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+class BuildManifest:
+    """
+    Záznam výstupů jednotlivých kroků sestavení pro inkrementální zpracování.
+
+    Pro každý krok (stage) a položku (name) se ukládá klíč (hash vstupu a parametrů, viz
+    stage_key) a seznam výstupních souborů. Krok je aktuální, pokud se klíč shoduje a všechny
+    výstupy existují - pak se může přeskočit a použít uložené výstupy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def get(self, stage, name):
+        """
+        Vrátí záznam kroku (slovník s klíči key, outputs a dalšími údaji), nebo None.
+        """
+        return self.entries.get(stage, {}).get(name)
+
+    def is_fresh(self, stage, name, key):
+        """
+        Vrátí True, pokud je krok zaznamenaný se stejným klíčem a všechny jeho výstupy existují.
+        """
+        entry = self.get(stage, name)
+        return entry is not None and entry["key"] == key and all(os.path.exists(path) for path in entry["outputs"])
+
+    def record(self, stage, name, key, outputs, **extra):
+        """
+        Zaznamená provedený krok.
+
+        :param stage: Název kroku.
+        :param name: Název položky (např. katalog nebo klíč části).
+        :param key: Klíč kroku (stage_key).
+        :param outputs: Seznam výstupních souborů.
+        :param extra: Další údaje uložené v záznamu.
+        """
+        self.entries.setdefault(stage, {})[name] = {"key": key, "outputs": list(outputs), **extra}
+
+    def remove(self, stage, name):
+        """
+        Odstraní záznam kroku a vrátí ho (nebo None).
+        """
+        return self.entries.get(stage, {}).pop(name, None)
+
+    def names(self, stage):
+        """
+        Vrátí názvy všech zaznamenaných položek kroku.
+        """
+        return list(self.entries.get(stage, {}))
+
+    def save(self):
+        """
+        Uloží manifest (přes dočasný soubor, aby přerušený zápis nepoškodil předchozí stav).
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -1,244 +1,633 @@
 from pygltflib import GLTF2, Buffer, Material
+import hashlib
+import json
+import numpy as np
 
-def remove_empty_nodes(gltf: GLTF2):
-    def is_empty(node_index: int) -> bool:
-        node = gltf.nodes[node_index]
-        # A node is empty if it has no mesh, no camera, and no children
-        return node.mesh is None and node.camera is None and len(node.children) == 0
+from accessors import add_accessor, get_buffer_bytes, read_accessor
 
-    # initial_node_count = len(gltf.nodes)
+INSTANCING_EXTENSION = "EXT_mesh_gpu_instancing"
 
-    # Iterate until no changes are needed
-    while True:
-        nodes_to_remove = set()
-        # Identify empty nodes
-        for i, node in enumerate(gltf.nodes):
-            if is_empty(i):
-                nodes_to_remove.add(i)
+def get_primitive_accessors(primitive):
+    """
+    Vrátí indexy všech accessors, na které odkazuje primitiva (atributy, indexy, morph targets).
+    """
+    accessors = []
+    if primitive.attributes:
+        accessors += [attr for attr in primitive.attributes.__dict__.values() if attr is not None]
+    if primitive.indices is not None:
+        accessors.append(primitive.indices)
+    for target in primitive.targets or []:
+        values = target.__dict__.values() if not isinstance(target, dict) else target.values()
+        accessors += [attr for attr in values if attr is not None]
+    return accessors
+
+def _instance_attributes(node):
+    extension = (node.extensions or {}).get(INSTANCING_EXTENSION)
+    return extension.get("attributes", {}) if isinstance(extension, dict) else {}
+
+def get_node_accessors(node):
+    """
+    Vrátí indexy accessors, na které odkazuje uzel (atributy instancí EXT_mesh_gpu_instancing).
+    """
+    return [value for value in _instance_attributes(node).values() if value is not None]
 
-        # If no nodes to remove, break the loop
-        if not nodes_to_remove:
-            break
+def remap_node_accessors(node, accessor_map):
+    """
+    Přečísluje odkazy uzlu na accessors (atributy instancí EXT_mesh_gpu_instancing).
+    """
+    attributes = _instance_attributes(node)
+    for key, value in attributes.items():
+        if value is not None:
+            attributes[key] = accessor_map[value]
+
+def _collect_extension_texture_infos(value, infos):
+    # Odkazy na textury v rozšířeních materiálu jsou slovníky s klíčem "index" (např. "diffuseTexture")
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.endswith("Texture") and isinstance(item, dict) and "index" in item:
+                infos.append(item)
+            else:
+                _collect_extension_texture_infos(item, infos)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_extension_texture_infos(item, infos)
+
+def get_texture_infos(material: Material):
+    """
+    Vrátí všechny odkazy na textury v materiálu - objekty TextureInfo i slovníky z rozšíření
+    (např. KHR_materials_pbrSpecularGlossiness).
+    """
+    infos = [material.emissiveTexture, material.normalTexture, material.occlusionTexture]
+    if material.pbrMetallicRoughness:
+        pbr = material.pbrMetallicRoughness
+        infos += [pbr.baseColorTexture, pbr.metallicRoughnessTexture]
+    infos = [info for info in infos if info and info.index is not None]
 
-        # Remove references to empty nodes from parents
-        for node in gltf.nodes:
-            node.children = [child for child in node.children if child not in nodes_to_remove]
+    _collect_extension_texture_infos(material.extensions, infos)
 
-        # Remove empty nodes and update index mapping
-        new_nodes = []
-        index_mapping = {}
-        new_index = 0
-        for i, node in enumerate(gltf.nodes):
-            if i not in nodes_to_remove:
-                index_mapping[i] = new_index
-                new_nodes.append(node)
-                new_index += 1
+    return infos
 
-        # Update children references to new indices
-        for node in new_nodes:
-            node.children = [index_mapping[child] for child in node.children]
+def get_texture_info_index(info):
+    return info["index"] if isinstance(info, dict) else info.index
 
-        # Update scene root nodes references to new indices
-        for scene in gltf.scenes:
-            scene.nodes = [index_mapping[node] for node in scene.nodes if node in index_mapping]
+def remap_texture_infos(material: Material, texture_map):
+    """
+    Přečísluje odkazy na textury v materiálu podle mapy starý index -> nový index.
+    """
+    for info in get_texture_infos(material):
+        if isinstance(info, dict):
+            info["index"] = texture_map[info["index"]]
+        else:
+            info.index = texture_map[info.index]
 
-        gltf.nodes = new_nodes
+def get_texture_sources(texture):
+    """
+    Vrátí indexy obrázků textury (source a zdroje z rozšíření jako EXT_texture_webp).
+    """
+    sources = [texture.source] if texture.source is not None else []
+    for extension in (texture.extensions or {}).values():
+        if isinstance(extension, dict) and extension.get("source") is not None:
+            sources.append(extension["source"])
+    return sources
 
-    # final_node_count = len(gltf.nodes)
-    # removed_node_count = initial_node_count - final_node_count
+def remap_texture_sources(texture, image_map):
+    """
+    Přečísluje odkazy textury na obrázky podle mapy starý index -> nový index.
+    """
+    if texture.source is not None:
+        texture.source = image_map[texture.source]
+    for extension in (texture.extensions or {}).values():
+        if isinstance(extension, dict) and extension.get("source") is not None:
+            extension["source"] = image_map[extension["source"]]
 
-    # print(f"Initial node count: {initial_node_count}")
-    # print(f"Removed node count: {removed_node_count}")
-    # print(f"Final node count: {final_node_count}")
+def remap_primitive_accessors(primitive, accessor_map):
+    """
+    Přečísluje odkazy primitivy na accessors (atributy, indexy, morph targets).
+    """
+    if primitive.indices is not None:
+        primitive.indices = accessor_map[primitive.indices]
+    for attributes in [primitive.attributes] + list(primitive.targets or []):
+        items = attributes if isinstance(attributes, dict) else attributes.__dict__
+        for key, value in items.items():
+            if value is not None:
+                items[key] = accessor_map[value]
+
+def find_empty_nodes(gltf: GLTF2):
+    """
+    Určí prázdné uzly jedním post-order průchodem (bez rekurze) přes všechny uzly.
 
-    # count_empty = sum(1 for i in range(len(gltf.nodes)) if is_empty(i))
-    # print(f"Any empty nodes left: {count_empty}")
+    Uzel je prázdný, pokud nemá mesh ani kameru a všechny jeho děti jsou prázdné.
 
-def optimize_buffers(gltf):
+    :return: Seznam bool indexovaný indexem uzlu.
     """
-    Optimalizuje buffery a odstraní nevyužitá data v GLTF souboru.
+    empty = [None] * len(gltf.nodes)
+    for root in range(len(gltf.nodes)):
+        if empty[root] is not None:
+            continue
+        stack = [(root, False)]
+        while stack:
+            node_index, children_done = stack.pop()
+            node = gltf.nodes[node_index]
+            if not children_done:
+                stack.append((node_index, True))
+                stack.extend((child, False) for child in node.children if empty[child] is None)
+                continue
+            empty[node_index] = node.mesh is None and node.camera is None and all(empty[child] for child in node.children)
+    return empty
+
+def remove_empty_nodes(gltf: GLTF2):
+    empty = find_empty_nodes(gltf)
+
+    # Přečíslování zachovaných uzlů
+    index_mapping = {}
+    new_nodes = []
+    for i, node in enumerate(gltf.nodes):
+        if not empty[i]:
+            index_mapping[i] = len(new_nodes)
+            new_nodes.append(node)
+
+    # Update children references to new indices
+    for node in new_nodes:
+        node.children = [index_mapping[child] for child in node.children if child in index_mapping]
+
+    # Update scene root nodes references to new indices
+    for scene in gltf.scenes:
+        scene.nodes = [index_mapping[node] for node in scene.nodes if node in index_mapping]
+
+    gltf.nodes = new_nodes
+
+def _sweep(items, used):
+    # Ponechá použité položky v původním pořadí a vrátí mapu starý index -> nový index
+    index_map = {}
+    kept = []
+    for i, item in enumerate(items):
+        if i in used:
+            index_map[i] = len(kept)
+            kept.append(item)
+    return kept, index_map
+
+def collect_garbage(gltf: GLTF2, compact = True):
+    """
+    Odstraní vše, co není dosažitelné ze scén (mark and sweep), a přečísluje reference.
+
+    Fáze mark jedním průchodem označí neprázdné uzly, meshes, skiny, kamery, materiály,
+    textury, samplery, obrázky, accessors a bufferViews. Fáze sweep odstraní neoznačené
+    položky, přečísluje všechny reference pomocí slovníků a zkopíruje použitá binární data
+    do nového kompaktního bufferu (zarovnání na 4 bajty).
+
+    :param gltf: GLTF objekt.
+    :param compact: Zkopírovat použitá data do nového bufferu. Bez toho zůstanou data GLB blobu
+                    na místě (např. mapovaná pomocí glb_io.load_glb) a nepoužité úseky vynechá
+                    až uložení. GLTF s více buffery nebo externím bufferem se zkopíruje vždy.
+    :return: GLTF objekt.
     """
+    empty = find_empty_nodes(gltf)
 
-    # Sbíráme využité accessors
+    # Mark - uzly dosažitelné ze scén, které nejsou prázdné (a klouby jejich skinů)
+    used_nodes = set()
+    used_meshes, used_skins, used_cameras = set(), set(), set()
     used_accessors = set()
+    stack = [node for scene in gltf.scenes for node in scene.nodes if not empty[node]]
+    while stack:
+        node_index = stack.pop()
+        if node_index in used_nodes:
+            continue
+        used_nodes.add(node_index)
+        node = gltf.nodes[node_index]
+        stack.extend(child for child in node.children if not empty[child])
+
+        if node.mesh is not None:
+            used_meshes.add(node.mesh)
+        if node.camera is not None:
+            used_cameras.add(node.camera)
+        used_accessors.update(get_node_accessors(node))
+
+        if node.skin is not None and node.skin not in used_skins:
+            used_skins.add(node.skin)
+            skin = gltf.skins[node.skin]
+            # Klouby skinu musí zůstat, i když samy nenesou geometrii - procházejí se stejně
+            # jako ostatní uzly, aby se označily i jejich meshe, kamery a potomci
+            stack.extend(skin.joints)
+            if skin.skeleton is not None:
+                stack.append(skin.skeleton)
+            if skin.inverseBindMatrices is not None:
+                used_accessors.add(skin.inverseBindMatrices)
+
+    used_materials = set()
+    for mesh_index in used_meshes:
+        for primitive in gltf.meshes[mesh_index].primitives:
+            if primitive.material is not None:
+                used_materials.add(primitive.material)
+            used_accessors.update(get_primitive_accessors(primitive))
+
+    # Animace - ponechají se jen kanály, které míří na zachované uzly
+    used_animations = set()
+    for animation_index, animation in enumerate(gltf.animations):
+        channels = [channel for channel in animation.channels if channel.target.node in used_nodes]
+        if not channels:
+            continue
+        used_animations.add(animation_index)
+        for channel in channels:
+            sampler = animation.samplers[channel.sampler]
+            used_accessors.update([sampler.input, sampler.output])
+
+    used_textures = set()
+    for material_index in used_materials:
+        used_textures.update(get_texture_info_index(info) for info in get_texture_infos(gltf.materials[material_index]))
+
+    used_images, used_samplers = set(), set()
+    for texture_index in used_textures:
+        texture = gltf.textures[texture_index]
+        used_images.update(get_texture_sources(texture))
+        if texture.sampler is not None:
+            used_samplers.add(texture.sampler)
+
+    used_buffer_views = set()
+    for accessor_index in used_accessors:
+        accessor = gltf.accessors[accessor_index]
+        if accessor.bufferView is not None:
+            used_buffer_views.add(accessor.bufferView)
+        if accessor.sparse:
+            used_buffer_views.add(accessor.sparse.indices.bufferView)
+            used_buffer_views.add(accessor.sparse.values.bufferView)
+    for image_index in used_images:
+        if gltf.images[image_index].bufferView is not None:
+            used_buffer_views.add(gltf.images[image_index].bufferView)
+
+    # Sweep
+    gltf.nodes, node_map = _sweep(gltf.nodes, used_nodes)
+    gltf.meshes, mesh_map = _sweep(gltf.meshes, used_meshes)
+    gltf.skins, skin_map = _sweep(gltf.skins, used_skins)
+    gltf.cameras, camera_map = _sweep(gltf.cameras, used_cameras)
+    gltf.materials, material_map = _sweep(gltf.materials, used_materials)
+    gltf.textures, texture_map = _sweep(gltf.textures, used_textures)
+    gltf.images, image_map = _sweep(gltf.images, used_images)
+    gltf.samplers, sampler_map = _sweep(gltf.samplers, used_samplers)
+    gltf.accessors, accessor_map = _sweep(gltf.accessors, used_accessors)
+    gltf.animations, _ = _sweep(gltf.animations, used_animations)
+    gltf.bufferViews, buffer_view_map = _sweep(gltf.bufferViews, used_buffer_views)
+
+    # Přečíslování referencí
+    for scene in gltf.scenes:
+        scene.nodes = [node_map[node] for node in scene.nodes if node in node_map]
+
+    for node in gltf.nodes:
+        node.children = [node_map[child] for child in node.children if child in node_map]
+        if node.mesh is not None:
+            node.mesh = mesh_map[node.mesh]
+        if node.skin is not None:
+            node.skin = skin_map[node.skin]
+        if node.camera is not None:
+            node.camera = camera_map[node.camera]
+        remap_node_accessors(node, accessor_map)
+
+    for skin in gltf.skins:
+        skin.joints = [node_map[joint] for joint in skin.joints]
+        if skin.skeleton is not None:
+            skin.skeleton = node_map[skin.skeleton]
+        if skin.inverseBindMatrices is not None:
+            skin.inverseBindMatrices = accessor_map[skin.inverseBindMatrices]
+
     for mesh in gltf.meshes:
         for primitive in mesh.primitives:
-            if primitive.attributes:
-                for attr in primitive.attributes.__dict__.values():  # Iterujeme přes atributy
-                    if attr is not None:
-                        used_accessors.add(attr)
-            if primitive.indices is not None:
-                used_accessors.add(primitive.indices)
+            if primitive.material is not None:
+                primitive.material = material_map[primitive.material]
+            remap_primitive_accessors(primitive, accessor_map)
+
+    for animation in gltf.animations:
+        channels = [channel for channel in animation.channels if channel.target.node in node_map]
+        sampler_indices = sorted({channel.sampler for channel in channels})
+        animation_sampler_map = {old: new for new, old in enumerate(sampler_indices)}
+        animation.samplers = [animation.samplers[i] for i in sampler_indices]
+        for channel in channels:
+            channel.target.node = node_map[channel.target.node]
+            channel.sampler = animation_sampler_map[channel.sampler]
+        animation.channels = channels
+        for sampler in animation.samplers:
+            sampler.input = accessor_map[sampler.input]
+            sampler.output = accessor_map[sampler.output]
 
-    # Sbíráme využité bufferViews z accessors
-    used_buffer_views = {gltf.accessors[acc].bufferView for acc in used_accessors if gltf.accessors[acc].bufferView is not None}
+    for material in gltf.materials:
+        remap_texture_infos(material, texture_map)
+
+    for texture in gltf.textures:
+        remap_texture_sources(texture, image_map)
+        if texture.sampler is not None:
+            texture.sampler = sampler_map[texture.sampler]
 
     for image in gltf.images:
         if image.bufferView is not None:
-            used_buffer_views.add(image.bufferView)
+            image.bufferView = buffer_view_map[image.bufferView]
 
-    # Vytváříme nový seznam bufferViews a mapujeme staré na nové
-    new_buffer_views = []
-    buffer_view_map = {}
-    for old_index in sorted(used_buffer_views):
-        buffer_view_map[old_index] = len(new_buffer_views)
-        new_buffer_views.append(gltf.bufferViews[old_index])
+    for accessor in gltf.accessors:
+        if accessor.bufferView is not None:
+            accessor.bufferView = buffer_view_map[accessor.bufferView]
+        if accessor.sparse:
+            accessor.sparse.indices.bufferView = buffer_view_map[accessor.sparse.indices.bufferView]
+            accessor.sparse.values.bufferView = buffer_view_map[accessor.sparse.values.bufferView]
 
-    gltf.bufferViews = new_buffer_views
+    if not compact and len(gltf.buffers) == 1 and gltf.buffers[0].uri is None:
+        return gltf
 
-    # Optimalizujeme buffer data
+    # Kopírování použitých dat do nového kompaktního bufferu
+    buffers = {}
     new_buffer_data = bytearray()
     for buffer_view in gltf.bufferViews:
+        if buffer_view.buffer not in buffers:
+            buffers[buffer_view.buffer] = get_buffer_bytes(gltf, buffer_view.buffer)
         start = buffer_view.byteOffset or 0
-        end = start + buffer_view.byteLength
+        new_buffer_data.extend(b"\0" * (-len(new_buffer_data) % 4))
         new_offset = len(new_buffer_data)
-        new_buffer_data.extend(gltf._glb_data[start:end])
-        buffer_view.byteOffset = new_offset  # Aktualizujeme offset v novém bufferu
-
-    for accessor in gltf.accessors:
-        if accessor.bufferView in buffer_view_map:
-            accessor.bufferView = buffer_view_map[accessor.bufferView]
+        new_buffer_data.extend(buffers[buffer_view.buffer][start:start + buffer_view.byteLength])
+        buffer_view.byteOffset = new_offset
+        buffer_view.buffer = 0
 
-    for image in gltf.images:
-        if image.bufferView in buffer_view_map:
-            image.bufferView = buffer_view_map[image.bufferView]
-
-    # Filtrování využitých accessors
-    gltf.accessors = [gltf.accessors[acc] for acc in sorted(used_accessors) if acc < len(gltf.accessors)]
-
-    # Aktualizace referencí mesh primitives
-    for mesh in gltf.meshes:
-        for primitive in mesh.primitives:
-            if primitive.attributes:
-                for attr_key in dir(primitive.attributes):
-                    if not attr_key.startswith('_'):
-                        attr_value = getattr(primitive.attributes, attr_key, None)
-                        if attr_value in used_accessors:
-                            setattr(primitive.attributes, attr_key, sorted(used_accessors).index(attr_value))
-            if primitive.indices is not None and primitive.indices in used_accessors:
-                primitive.indices = sorted(used_accessors).index(primitive.indices)
-
-    # Uložíme nové buffer data jako inline base64
     gltf.buffers = [Buffer(byteLength=len(new_buffer_data))]
-
-    # Zapisujeme optimalizovaná data zpět do _glb_data
-    gltf._glb_data = new_buffer_data
+    gltf.set_binary_blob(new_buffer_data)
 
     return gltf
 
+def optimize_buffers(gltf):
+    """
+    Optimalizuje buffery a odstraní nevyužitá data v GLTF souboru.
+    """
+    return collect_garbage(gltf)
+
 def clean_gltf(gltf):
     """
     Odstraní nepoužívané geometrie, materiály, textury a buffery z GLTF souboru.
     """
+    return collect_garbage(gltf)
 
-    remove_empty_nodes(gltf)
 
-    # Shromáždění použitých meshes z uzlů
-    used_meshes = {node.mesh for node in gltf.nodes if node.mesh is not None}
+def get_used_buffer_size(gltf: GLTF2):
+    """
+    Vrátí velikost binárních dat, na která odkazují bufferViews (po zarovnání na 4 bajty).
+    Odpovídá velikosti BIN chunku po uložení.
+    """
+    ranges = {(buffer_view.buffer, buffer_view.byteOffset or 0): buffer_view.byteLength for buffer_view in gltf.bufferViews}
+    return sum(length + (-length % 4) for length in ranges.values())
+
+def _json_key(value):
+    # Stabilní textový klíč pro slovníky z rozšíření a morph targets
+    if hasattr(value, "to_dict"):
+        value = value.to_dict()
+    elif hasattr(value, "__dict__"):
+        value = value.__dict__
+    return json.dumps(value, sort_keys=True, default=str)
+
+def deduplicate_geometry(gltf: GLTF2):
+    """
+    Sloučí identické bufferViews, accessors a meshes do jedné sdílené instance.
 
-    # Shromáždění použitých materiálů z použitých meshes
-    used_materials = set()
-    for mesh_index in used_meshes:
-        mesh = gltf.meshes[mesh_index]
+    BufferViews se porovnávají podle hashe svých bajtů (a byteStride, target), accessors podle
+    sloučeného bufferView a svých parametrů, meshes podle primitiv po přečíslování accessorů.
+    Reference se přečíslují a nepoužitá data se odstraní pomocí collect_garbage (z bufferu při uložení).
+
+    :param gltf: GLTF objekt.
+    :return: Slovník s počty sloučených položek a ušetřenými bajty.
+    """
+    # Nejprve odstranění nedosažitelných dat, aby ušetřené bajty odpovídaly jen deduplikaci
+    collect_garbage(gltf, compact=False)
+    original_size = get_used_buffer_size(gltf)
+
+    # BufferViews se stejnými daty
+    buffers = {}
+    buffer_view_map = {}
+    seen = {}
+    for index, buffer_view in enumerate(gltf.bufferViews):
+        if buffer_view.buffer not in buffers:
+            buffers[buffer_view.buffer] = memoryview(get_buffer_bytes(gltf, buffer_view.buffer))
+        start = buffer_view.byteOffset or 0
+        digest = hashlib.blake2b(buffers[buffer_view.buffer][start:start + buffer_view.byteLength], digest_size=16).digest()
+        key = (digest, buffer_view.byteLength, buffer_view.byteStride, buffer_view.target)
+        buffer_view_map[index] = seen.setdefault(key, index)
+
+    for accessor in gltf.accessors:
+        if accessor.bufferView is not None:
+            accessor.bufferView = buffer_view_map[accessor.bufferView]
+        if accessor.sparse:
+            accessor.sparse.indices.bufferView = buffer_view_map[accessor.sparse.indices.bufferView]
+            accessor.sparse.values.bufferView = buffer_view_map[accessor.sparse.values.bufferView]
+    for image in gltf.images:
+        if image.bufferView is not None:
+            image.bufferView = buffer_view_map[image.bufferView]
+
+    # Accessors nad stejnými daty se stejnými parametry
+    accessor_map = {}
+    seen = {}
+    for index, accessor in enumerate(gltf.accessors):
+        key = (
+            accessor.bufferView, accessor.byteOffset or 0, accessor.componentType, bool(accessor.normalized),
+            accessor.count, accessor.type, _json_key(accessor.sparse) if accessor.sparse else None,
+        )
+        accessor_map[index] = seen.setdefault(key, index)
+
+    for mesh in gltf.meshes:
         for primitive in mesh.primitives:
-            if primitive.material is not None:
-                used_materials.add(primitive.material)
+            remap_primitive_accessors(primitive, accessor_map)
+    for node in gltf.nodes:
+        remap_node_accessors(node, accessor_map)
+    for skin in gltf.skins:
+        if skin.inverseBindMatrices is not None:
+            skin.inverseBindMatrices = accessor_map[skin.inverseBindMatrices]
+    for animation in gltf.animations:
+        for sampler in animation.samplers:
+            sampler.input = accessor_map[sampler.input]
+            sampler.output = accessor_map[sampler.output]
+
+    # Meshes se stejnými primitivami
+    mesh_map = {}
+    seen = {}
+    for index, mesh in enumerate(gltf.meshes):
+        key = (tuple(
+            (
+                tuple(sorted((name, value) for name, value in primitive.attributes.__dict__.items() if value is not None)),
+                primitive.indices, primitive.material, primitive.mode,
+                _json_key(primitive.targets or []), _json_key(primitive.extensions or {}),
+            )
+            for primitive in mesh.primitives
+        ), tuple(mesh.weights or []), _json_key(mesh.extensions or {}))
+        mesh_map[index] = seen.setdefault(key, index)
 
-    # Shromáždění použitých textur z použitých materiálů
-    used_textures = set()
-    for material_index in used_materials:
-        material: Material = gltf.materials[material_index]
-        if material.emissiveTexture:
-            used_textures.add(material.emissiveTexture.index)
-        if material.normalTexture:
-            used_textures.add(material.normalTexture.index)
-        if material.occlusionTexture:
-            used_textures.add(material.occlusionTexture.index)
-        
-        if material.extensions.get('KHR_materials_pbrSpecularGlossiness'):
-            pbr = material.extensions['KHR_materials_pbrSpecularGlossiness']
-            if pbr.get('diffuseTexture'):
-                used_textures.add(pbr['diffuseTexture']['index'])
-            if pbr.get('specularGlossinessTexture'):
-                used_textures.add(pbr['specularGlossinessTexture']['index'])
-
-        if material.pbrMetallicRoughness:
-            pbr = material.pbrMetallicRoughness
-            if pbr.baseColorTexture:
-                used_textures.add(pbr.baseColorTexture.index)
-            if pbr.metallicRoughnessTexture:
-                used_textures.add(pbr.metallicRoughnessTexture.index)
-
-    # Shromáždění použitých images z použitých textur
-    used_images = set()
-    for texture_index in used_textures:
-        texture = gltf.textures[texture_index]
-        if texture.source is not None:
-            used_images.add(texture.source)
-
-    used_buffers = set(range(len(gltf.buffers)))  # Buffery budeme optimalizovat později
-
-    # Filtruj položky na základě použitých referencí
-    gltf.meshes = [mesh for i, mesh in enumerate(gltf.meshes) if i in used_meshes]
-    gltf.materials = [material for i, material in enumerate(gltf.materials) if i in used_materials]
-    gltf.textures = [texture for i, texture in enumerate(gltf.textures) if i in used_textures]
-    gltf.images = [image for i, image in enumerate(gltf.images) if i in used_images]
-    gltf.buffers = [buffer for i, buffer in enumerate(gltf.buffers) if i in used_buffers]
-
-    # Aktualizace referencí v uzlech a ostatních objektech
-    def remap_indices(items, used_indices):
-        """
-        Přečísluje indexy položek na základě použitých referencí.
-        """
-        index_map = {old: new for new, old in enumerate(sorted(used_indices))}
-        return [index_map[i] for i in used_indices], index_map
-
-    _, mesh_map = remap_indices(gltf.meshes, used_meshes)
-    _, material_map = remap_indices(gltf.materials, used_materials)
-    _, texture_map = remap_indices(gltf.textures, used_textures)
-    _, image_map = remap_indices(gltf.images, used_images)
-
-    # Aktualizace referencí v uzlech
     for node in gltf.nodes:
         if node.mesh is not None:
             node.mesh = mesh_map[node.mesh]
 
-    # Aktualizace referencí v primitivách
+    collect_garbage(gltf, compact=False)
+
+    stats = {
+        "bufferViews": sum(1 for old, new in buffer_view_map.items() if old != new),
+        "accessors": sum(1 for old, new in accessor_map.items() if old != new),
+        "meshes": sum(1 for old, new in mesh_map.items() if old != new),
+        "saved_bytes": original_size - get_used_buffer_size(gltf),
+    }
+
+    print(f"Deduplikace: sloučeno {stats['bufferViews']} bufferViews, {stats['accessors']} accessors, {stats['meshes']} meshes, ušetřeno {stats['saved_bytes']} B.")
+
+    return stats
+
+def _morton_codes(points):
+    # 10 bitů na osu -> 30bitový kód Z-křivky
+    low = points.min(axis=0)
+    extent = points.max(axis=0) - low
+    extent[extent == 0] = 1
+    quantized = ((points - low) / extent * 1023).astype(np.uint32)
+
+    codes = np.zeros(len(points), dtype=np.uint32)
+    for axis in range(3):
+        value = quantized[:, axis]
+        value = (value | (value << 16)) & 0x030000FF
+        value = (value | (value << 8)) & 0x0300F00F
+        value = (value | (value << 4)) & 0x030C30C3
+        value = (value | (value << 2)) & 0x09249249
+        codes |= value << axis
+    return codes
+
+def _sort_triangles(indices, positions):
+    # Trojúhelníky seřazené podle Mortonova kódu těžiště - sousední trojúhelníky sdílí vrcholy
+    triangles = indices.reshape(-1, 3)
+    centroids = positions[triangles].mean(axis=1)
+    order = np.argsort(_morton_codes(centroids), kind="stable")
+    return triangles[order].ravel()
+
+def _index_dtype(vertex_count, allow_uint8):
+    # Maximální hodnota typu je rezervovaná (primitive restart)
+    if allow_uint8 and vertex_count < 255:
+        return np.uint8
+    if vertex_count < 65535:
+        return np.uint16
+    return np.uint32
+
+def _vertex_accessors(primitive):
+    # Accessors vrcholových dat primitivy (atributy a morph targets) bez indexů
+    accessors = get_primitive_accessors(primitive)
+    if primitive.indices is not None:
+        accessors.remove(primitive.indices)
+    return tuple(sorted(set(accessors)))
+
+def _copy_vertex_accessor(gltf: GLTF2, blob, accessor_index, values):
+    accessor = gltf.accessors[accessor_index]
+    item_size = values.dtype.itemsize * values.shape[1]
+    # Vrcholové atributy zarovnané na 4 bajty
+    byte_stride = item_size + (-item_size % 4) if item_size % 4 else None
+    return add_accessor(gltf, blob, values, normalized=bool(accessor.normalized), target=34962,
+                        byte_stride=byte_stride, min_max=accessor.min is not None)
+
+def optimize_indices(gltf: GLTF2, reorder = True, compact = True, allow_uint8 = False):
+    """
+    Optimalizuje indexová data trojúhelníkových meshů.
+
+    - Seřadí trojúhelníky podle Mortonova kódu těžiště (lokalita vertex cache).
+    - Přečísluje vrcholy podle prvního použití a odstraní vrcholy, na které neukazuje žádný index
+      (jen pokud vrcholová data nesdílí jiná primitiva s odlišnou sadou atributů).
+    - Zúží typ indexů na uint16 (s allow_uint8 i uint8), pokud to počet vrcholů dovolí.
+
+    Nová data se připojí na konec bufferu, původní odstraní collect_garbage.
+
+    :param gltf: GLTF objekt (GLB s jedním bufferem).
+    :param reorder: Přeuspořádat trojúhelníky.
+    :param compact: Odstranit nepoužité vrcholy a přečíslovat je podle prvního použití.
+    :param allow_uint8: Povolit indexy typu uint8 (WebGPU je nepodporuje a některé prohlížeče
+                        je při načtení převádí, proto výchozí vypnuto).
+    :return: Slovník s počty zpracovaných primitiv, odstraněných vrcholů a ušetřenými bajty.
+    """
+    # Nejprve odstranění nedosažitelných dat, aby ušetřené bajty odpovídaly jen úpravě indexů
+    collect_garbage(gltf, compact=False)
+    original_size = get_used_buffer_size(gltf)
+
+    # Primitiva se stejnou sadou vrcholových dat se zpracují společně
+    groups = {}
     for mesh in gltf.meshes:
         for primitive in mesh.primitives:
-            if primitive.material is not None:
-                primitive.material = material_map[primitive.material]
-            # if primitive.indices is not None:
-            #     primitive.indices = mesh_map[primitive.indices]
-
-    # Aktualizace referencí v materiálech
-    for material in gltf.materials:
+            if primitive.indices is not None:
+                groups.setdefault(_vertex_accessors(primitive), []).append(primitive)
 
-        if material.emissiveTexture:
-            material.emissiveTexture.index = texture_map[material.emissiveTexture.index]
-        if material.normalTexture:
-            material.normalTexture.index = texture_map[material.normalTexture.index]
-        if material.occlusionTexture:
-            material.occlusionTexture.index = texture_map[material.occlusionTexture.index]
-
-        if material.extensions.get('KHR_materials_pbrSpecularGlossiness'):
-            pbr = material.extensions['KHR_materials_pbrSpecularGlossiness']
-            if pbr.get('diffuseTexture'):
-                pbr['diffuseTexture']['index'] = texture_map[pbr['diffuseTexture']['index']]
-            if pbr.get('specularGlossinessTexture'):
-                pbr['specularGlossinessTexture']['index'] = texture_map[pbr['specularGlossinessTexture']['index']]
-
-        if material.pbrMetallicRoughness:
-            pbr = material.pbrMetallicRoughness
-            if pbr.baseColorTexture:
-                pbr.baseColorTexture.index = texture_map[pbr.baseColorTexture.index]
-            if pbr.metallicRoughnessTexture:
-                pbr.metallicRoughnessTexture.index = texture_map[pbr.metallicRoughnessTexture.index]
-
-    # Aktualizace referencí v texturách
-    for texture in gltf.textures:
-        if texture.source is not None:
-            texture.source = image_map[texture.source]
+    # Accessors použité více skupinami, neindexovanými primitivy nebo mimo meshe nelze zkrátit
+    owners = {}
+    for mesh in gltf.meshes:
+        for primitive in mesh.primitives:
+            group = _vertex_accessors(primitive) if primitive.indices is not None else None
+            for accessor_index in _vertex_accessors(primitive):
+                owners.setdefault(accessor_index, set()).add(group)
+    for skin in gltf.skins:
+        if skin.inverseBindMatrices is not None:
+            owners.setdefault(skin.inverseBindMatrices, set()).add(None)
+    for animation in gltf.animations:
+        for sampler in animation.samplers:
+            owners.setdefault(sampler.input, set()).add(None)
+            owners.setdefault(sampler.output, set()).add(None)
+
+    blob = bytearray(gltf.binary_blob() or b"")
+    buffers = {}
+    stats = {"primitives": 0, "removed_vertices": 0, "saved_bytes": 0}
+
+    for vertex_accessors, primitives in groups.items():
+        position = primitives[0].attributes.POSITION
+        positions = None
+
+        # Indexy načtené jednou pro každý accessor skupiny
+        index_arrays = {}
+        for primitive in primitives:
+            if primitive.indices in index_arrays:
+                continue
+            indices = read_accessor(gltf, primitive.indices, normalize=False, buffers=buffers)[:, 0].astype(np.uint32)
+            if reorder and position is not None and primitive.mode in (None, 4) and len(indices) % 3 == 0 and len(indices) > 3:
+                if positions is None:
+                    positions = read_accessor(gltf, position, buffers=buffers)
+                indices = _sort_triangles(indices, positions)
+            index_arrays[primitive.indices] = indices
+
+        vertex_count = gltf.accessors[vertex_accessors[0]].count if vertex_accessors else 0
+        exclusive = vertex_accessors and all(
+            owners[accessor_index] == {vertex_accessors} and gltf.accessors[accessor_index].count == vertex_count
+            for accessor_index in vertex_accessors
+        )
+
+        if compact and exclusive:
+            # Přečíslování podle prvního použití; nepoužité vrcholy vypadnou
+            used = np.concatenate(list(index_arrays.values()))
+            unique, first = np.unique(used, return_index=True)
+            order = unique[np.argsort(first, kind="stable")]
+            remap = np.zeros(vertex_count, dtype=np.uint32)
+            remap[order] = np.arange(len(order), dtype=np.uint32)
+
+            index_arrays = {index: remap[indices] for index, indices in index_arrays.items()}
+            accessor_map = {
+                accessor_index: _copy_vertex_accessor(gltf, blob, accessor_index,
+                                                      read_accessor(gltf, accessor_index, normalize=False, buffers=buffers)[order])
+                for accessor_index in vertex_accessors
+            }
+            for primitive in primitives:
+                remap_primitive_accessors(primitive, {**accessor_map, primitive.indices: primitive.indices})
+
+            stats["removed_vertices"] += vertex_count - len(order)
+            vertex_count = len(order)
+
+        dtype = _index_dtype(vertex_count, allow_uint8)
+        index_map = {
+            accessor_index: add_accessor(gltf, blob, indices.astype(dtype), target=34963)
+            for accessor_index, indices in index_arrays.items()
+        }
+        for primitive in primitives:
+            primitive.indices = index_map[primitive.indices]
+
+        stats["primitives"] += len(primitives)
+
+    if not groups:
+        return stats
+
+    gltf.buffers[0].byteLength = len(blob)
+    gltf.set_binary_blob(blob)
+
+    # Odstranění původních dat (nepoužité úseky bufferu vynechá až uložení)
+    collect_garbage(gltf, compact=False)
+
+    stats["saved_bytes"] = original_size - get_used_buffer_size(gltf)
+
+    print(f"Optimalizace indexů: {stats['primitives']} primitiv, odstraněno {stats['removed_vertices']} vrcholů, ušetřeno {stats['saved_bytes']} B.")
+
+    return stats
 
 
 if __name__ == "__main__":
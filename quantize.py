@@ -0,0 +1,130 @@
+from pygltflib import GLTF2, Node
+import numpy as np
+
+from accessors import add_accessor, read_accessor
+from optimize import INSTANCING_EXTENSION, collect_garbage
+
+EXTENSION_NAME = "KHR_mesh_quantization"
+
+def _quantize_normalized(values, dtype):
+    # Převod hodnot z rozsahu <-1, 1> (resp. <0, 1>) na normalizovaná celá čísla
+    info = np.iinfo(dtype)
+    return np.clip(np.round(values * info.max), info.min if info.min < 0 else 0, info.max).astype(dtype)
+
+def _is_static_mesh(gltf: GLTF2, mesh_index, mesh_nodes):
+    # Skinované meshe, meshe s morph targets a instancované meshe se nekvantizují
+    # (dekvantizační transformace uzlu by se použila až po transformaci instancí)
+    mesh = gltf.meshes[mesh_index]
+    if mesh.weights:
+        return False
+    for primitive in mesh.primitives:
+        if primitive.targets or getattr(primitive.attributes, "POSITION", None) is None:
+            return False
+        if getattr(primitive.attributes, "JOINTS_0", None) is not None:
+            return False
+    return all(
+        gltf.nodes[node].skin is None and not getattr(gltf.nodes[node], "weights", None)
+        and INSTANCING_EXTENSION not in (gltf.nodes[node].extensions or {})
+        for node in mesh_nodes
+    )
+
+def quantize_meshes(gltf: GLTF2, positions = True, normals = True, texcoords = True):
+    """
+    Kvantizuje vrcholová data meshů podle rozšíření KHR_mesh_quantization.
+
+    - POSITION: normalizovaný int16 v rámci bounding boxu meshe. Dekvantizace (posun do středu
+      a rovnoměrné měřítko) se uloží do nového podřízeného uzlu, který mesh nese.
+    - NORMAL: normalizovaný int8.
+    - TEXCOORD_n: normalizovaný uint16, pouze pokud jsou všechny souřadnice v rozsahu <0, 1>.
+
+    Vrcholové atributy jsou zarovnané na 4 bajty (byteStride). Původní float data se odstraní
+    pomocí collect_garbage, z bufferu při uložení.
+
+    :param gltf: GLTF objekt (GLB s jedním bufferem).
+    :param positions: Kvantizovat pozice.
+    :param normals: Kvantizovat normály.
+    :param texcoords: Kvantizovat texturovací souřadnice.
+    :return: GLTF objekt.
+    """
+    mesh_nodes = {}
+    for node_index, node in enumerate(gltf.nodes):
+        if node.mesh is not None:
+            mesh_nodes.setdefault(node.mesh, []).append(node_index)
+
+    blob = bytearray(gltf.binary_blob() or b"")
+    buffers = {}
+    quantized = {}
+    changed = False
+
+    for mesh_index, node_indices in mesh_nodes.items():
+        if not _is_static_mesh(gltf, mesh_index, node_indices):
+            continue
+        mesh = gltf.meshes[mesh_index]
+
+        if positions:
+            # Společný box všech primitiv meshe - všechny sdílí jednu dekvantizační transformaci
+            points = [read_accessor(gltf, primitive.attributes.POSITION, buffers=buffers) for primitive in mesh.primitives]
+            box_min = np.min([p.min(axis=0) for p in points if len(p)], axis=0)
+            box_max = np.max([p.max(axis=0) for p in points if len(p)], axis=0)
+            center = (box_min + box_max) / 2
+            # Rovnoměrné měřítko, aby se nezkreslily normály
+            scale = float(np.max(box_max - box_min) / 2) or 1.0
+
+            for primitive, values in zip(mesh.primitives, points):
+                key = ("POSITION", primitive.attributes.POSITION, tuple(center), scale)
+                if key not in quantized:
+                    values = _quantize_normalized((values - center) / scale, np.int16)
+                    quantized[key] = add_accessor(gltf, blob, values, normalized=True, target=34962, byte_stride=8, min_max=True)
+                primitive.attributes.POSITION = quantized[key]
+
+            # Mesh se přesune do podřízeného uzlu s dekvantizační transformací
+            for node_index in node_indices:
+                node = gltf.nodes[node_index]
+                gltf.nodes.append(Node(
+                    name=(node.name or f"node{node_index}") + "_quantized",
+                    mesh=mesh_index,
+                    translation=center.tolist(),
+                    scale=[scale, scale, scale],
+                ))
+                node.mesh = None
+                node.children = list(node.children) + [len(gltf.nodes) - 1]
+
+        for primitive in mesh.primitives:
+            for name, accessor_index in list(primitive.attributes.__dict__.items()):
+                if accessor_index is None or gltf.accessors[accessor_index].componentType != 5126:
+                    continue
+
+                if normals and name == "NORMAL":
+                    key = (name, accessor_index)
+                    if key not in quantized:
+                        values = _quantize_normalized(read_accessor(gltf, accessor_index, buffers=buffers), np.int8)
+                        quantized[key] = add_accessor(gltf, blob, values, normalized=True, target=34962, byte_stride=4)
+                    setattr(primitive.attributes, name, quantized[key])
+
+                elif texcoords and name.startswith("TEXCOORD_"):
+                    key = (name, accessor_index)
+                    if key not in quantized:
+                        values = read_accessor(gltf, accessor_index, buffers=buffers)
+                        if len(values) == 0 or values.min() < 0 or values.max() > 1:
+                            # Souřadnice mimo <0, 1> (opakované textury) zůstávají ve float
+                            quantized[key] = accessor_index
+                        else:
+                            quantized[key] = add_accessor(gltf, blob, _quantize_normalized(values, np.uint16), normalized=True, target=34962)
+                    setattr(primitive.attributes, name, quantized[key])
+
+        changed = True
+
+    if not changed:
+        return gltf
+
+    gltf.buffers[0].byteLength = len(blob)
+    gltf.set_binary_blob(blob)
+
+    for extensions in (gltf.extensionsUsed, gltf.extensionsRequired):
+        if EXTENSION_NAME not in extensions:
+            extensions.append(EXTENSION_NAME)
+
+    # Odstranění původních float dat (nepoužité úseky bufferu vynechá až uložení)
+    collect_garbage(gltf, compact=False)
+
+    return gltf
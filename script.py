@@ -1,12 +1,19 @@
 from pygltflib import GLTF2
 import os
-from attributes import remove_normals
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from attributes import remove_normals, strip_attributes
+from glb_io import load_glb, open_glb, save_glb
 from glb_thumbnail_generator import call_histruct_renderer, call_thumbnail_generator
-from align import align_glb_to_center
-from optimize import clean_gltf, optimize_buffers, remove_empty_nodes
-from split import split_glb_by_root_nodes
+from align import align_gltf_to_center, save_size
+from quantize import quantize_meshes
+from instancing import instance_meshes
+from instrument import Instrumentation
+from manifest import BuildManifest, hash_file, hash_gltf, stage_key
+from optimize import clean_gltf, deduplicate_geometry, get_used_buffer_size, optimize_buffers, optimize_indices, remove_empty_nodes
+from split import split_glb_by_root_nodes, split_glb_to_level, split_gltf_to_level
 from texture import process_images_in_gltf
-import shutil
+from texture_cache import TextureCache
 
 
 def split(input_glb_path, output_dir, output_filename):
@@ -42,69 +49,397 @@ def image_optimize(path):
 
     return new_path
 
-def split_to_level(base_glb_path, name, temp_folder, level, stop_level):
+def _check_tiers(tiers):
+    # Hlavní výstup (náhled, all_models.txt) je úroveň s prázdnou příponou
+    if tiers and sum(1 for tier in tiers if tier.suffix == "") != 1:
+        raise ValueError("Právě jedna úroveň textur (tiers) musí mít prázdnou příponu.")
+
+def process_gltf(gltf: GLTF2, output_path, align_to = [0, 1, 0], image_workers = None, texture_cache = None, tiers = None, quantize = False, instrument = None, drop_attributes = ("NORMAL", "TANGENT"), instancing = None):
+    """
+    Zpracuje načtený GLTF objekt v paměti: zarovnání, vyčištění, optimalizace bufferů,
+    odstranění normál a optimalizace obrázků. Uloží se pouze výsledek (bez mezisouborů
+    _aligned, _clean, _optimized) a vedle něj soubor _size.txt.
+
+    :param gltf: GLTF objekt (např. část ze split_gltf_to_level).
+    :param output_path: Cesta k výstupnímu GLB souboru.
+    :param align_to: Zarovnání v jednotlivých osách (viz align_gltf_to_center).
+    :param image_workers: Počet vláken pro kódování obrázků (None = sériově).
+    :param texture_cache: Volitelný TextureCache pro opakovaně použité textury.
+    :param tiers: Volitelný seznam TextureTier - pro každou úroveň se uloží samostatný GLB
+                  (output_path s příponou tier.suffix), textury se přitom dekódují jen jednou.
+                  Právě jedna úroveň (hlavní - náhled, all_models.txt) musí mít prázdnou
+                  příponu, jinak se vyvolá ValueError.
+    :param quantize: Kvantizovat vrcholová data (KHR_mesh_quantization).
+    :param instrument: Volitelný Instrumentation pro měření jednotlivých kroků.
+    :param drop_attributes: Vzory odstraňovaných vrcholových atributů (viz strip_attributes),
+                            např. attributes.UNUSED_ATTRIBUTES.
+    :param instancing: Minimální počet uzlů se stejným meshem pro EXT_mesh_gpu_instancing
+                       (None = bez instancování, viz instancing.MIN_INSTANCES).
+    :return: Cesta k výstupnímu souboru, nebo None pokud objekt neobsahuje geometrii.
+    """
+    _check_tiers(tiers)
+
+    instrument = instrument or Instrumentation(enabled=False)
+
+    with instrument.stage("align", get_used_buffer_size(gltf)) as record:
+        size = align_gltf_to_center(gltf, align_to)
+        record["output_bytes"] = record["input_bytes"]
+
+    if size is None:
+        print(f"No geometry found for '{output_path}'.")
+        return None
+
+    save_size(output_path.replace(".glb", "_size.txt"), size, align_to)
+
+    # Sloučení identické geometrie, odstranění prázdných uzlů a nepoužitých dat
+    # (deduplicate_geometry končí voláním collect_garbage)
+    with instrument.stage("deduplicate", get_used_buffer_size(gltf)) as record:
+        deduplicate_geometry(gltf)
+        record["output_bytes"] = get_used_buffer_size(gltf)
+
+    with instrument.stage("strip_attributes", get_used_buffer_size(gltf)) as record:
+        strip_attributes(gltf, drop=drop_attributes, compact=False)
+        record["output_bytes"] = get_used_buffer_size(gltf)
+
+    with instrument.stage("optimize_indices", get_used_buffer_size(gltf)) as record:
+        optimize_indices(gltf)
+        record["output_bytes"] = get_used_buffer_size(gltf)
+
+    if quantize:
+        with instrument.stage("quantize", get_used_buffer_size(gltf)) as record:
+            quantize_meshes(gltf)
+            record["output_bytes"] = get_used_buffer_size(gltf)
+
+    # Až po kvantizaci - instance se skládají ze světových matic včetně dekvantizace
+    if instancing is not None:
+        with instrument.stage("instancing", get_used_buffer_size(gltf)) as record:
+            instance_meshes(gltf, min_instances=instancing)
+            record["output_bytes"] = get_used_buffer_size(gltf)
+
+    if tiers:
+        with instrument.stage("images", get_used_buffer_size(gltf)) as record:
+            tier_gltfs = process_images_in_gltf(gltf, workers=image_workers, cache=texture_cache, tiers=tiers)
+            record["output_bytes"] = sum(get_used_buffer_size(tier_gltf) for _, tier_gltf in tier_gltfs)
+
+        with instrument.stage("save", record["output_bytes"]) as record:
+            for tier, tier_gltf in tier_gltfs:
+                save_glb(tier_gltf, output_path.replace(".glb", tier.suffix + ".glb"))
+            record["output_bytes"] = sum(os.path.getsize(output_path.replace(".glb", tier.suffix + ".glb")) for tier, _ in tier_gltfs)
+        return output_path
+
+    with instrument.stage("images", get_used_buffer_size(gltf)) as record:
+        process_images_in_gltf(gltf, workers=image_workers, cache=texture_cache)
+        record["output_bytes"] = get_used_buffer_size(gltf)
+
+    with instrument.stage("save", record["output_bytes"]) as record:
+        save_glb(gltf, output_path)
+        record["output_bytes"] = os.path.getsize(output_path)
+
+    return output_path
+
+def process(path, output_path = None, align_to = [0, 1, 0]):
+    """
+    Načte GLB soubor jednou a zpracuje ho pomocí process_gltf.
+    """
+    # Načtení GLB souboru
+    gltf = load_glb(path)
 
-    output_name_level = name + "_level" + str(level)
-    new_files_level = split_glb_by_root_nodes(base_glb_path, temp_folder, output_name_level)
+    if output_path is None:
+        output_path = path.replace('.glb', '_optimized.glb')
 
-    if level == stop_level:
-        return new_files_level
-    
-    for file in new_files_level:
-        return split_to_level(file, name, temp_folder, level + 1, stop_level)
-    
+    return process_gltf(gltf, output_path, align_to)
 
-def runName(basePath, output_folder, name):
+def split_to_level(base_glb_path, name, temp_folder, stop_level):
+    return split_glb_to_level(base_glb_path, temp_folder, name, stop_level)
+
+def runName(basePath, output_folder, name, level = 2, tiers = None, thumbnails = None, instrumentation = None):
 
     output_folder = os.path.join(output_folder, name)
     os.makedirs(output_folder, exist_ok=True)
 
     glb_path = os.path.join(basePath, name + ".glb")
 
-    temp_folder = os.path.join(basePath, "temp\\", name)
+    instrumentation = instrumentation or Instrumentation(enabled=False)
 
-    splited_files = split_to_level(glb_path, name, temp_folder, 0, 2)
+    # Katalog se načte jen jednou a dělí se v paměti bez mezisouborů
+    with instrumentation.child(name).stage("split", os.path.getsize(glb_path)) as record:
+        with open_glb(glb_path) as gltf:
+            parts = list(split_gltf_to_level(gltf, level))
+        record["output_bytes"] = sum(len(part.binary_blob() or b"") for _, part in parts)
+    instrumentation.extend([record])
 
-    print("Splited files:")
-    print(splited_files)
+    print("Splited parts:")
+    print([part_name for part_name, _ in parts])
 
     files = []
+    renders = []
+
+    texture_cache = TextureCache(os.path.join(basePath, "temp", "texture_cache"))
 
     i = 1
-    for file in splited_files:
+    for _, part in parts:
 
-        align_file = align_glb_to_center(file, None, [0, 1, 0])
-        clean_file = clean(align_file)
-        optimalized_file = image_optimize(clean_file)
+        # final file name in output folder, index instead of node name
+        final_name = os.path.join(output_folder, name + "_level" + str(level) + "-" + str(i))
+        final_glb = final_name + ".glb"
+        final_png = final_name + ".png"
 
-        thumbnail_file = optimalized_file
-        final_file = optimalized_file
+        instrument = instrumentation.child(name + "/" + str(i))
+        final_file = process_gltf(part, final_glb, [0, 1, 0], image_workers=os.cpu_count(), texture_cache=texture_cache, tiers=tiers, instrument=instrument)
+        instrumentation.extend(instrument.records)
 
         if final_file is None:
             continue
-        
-        thumnail_path = call_histruct_renderer(thumbnail_file, None, 512, 512)
 
-        # mode final file to output folder, replace all after "-" with index
-        final_name = os.path.join( output_folder, os.path.basename(final_file).split("-")[0] + "-" + str(i))
-        final_glb = final_name + ".glb"
-        final_txt = final_name + "_size.txt"
-        final_png = final_name + ".png"
+        # Náhled - sdílený ThumbnailWorker (běží souběžně s další částí), jinak externí renderer
+        if thumbnails is not None:
+            renders.append(thumbnails.submit(final_file, final_png))
+        else:
+            with instrument.stage("render", os.path.getsize(final_file)) as record:
+                call_histruct_renderer(final_file, final_png, 512, 512)
+                record["output_bytes"] = os.path.getsize(final_png) if os.path.exists(final_png) else None
+            instrumentation.extend([record])
 
         files.append(final_glb)
 
-        # copy final file
-        shutil.copy(final_file, final_glb)
-        shutil.copy(file.replace(".glb", "_size.txt"), final_txt)
-        if os.path.exists(thumnail_path):
-            shutil.copy(thumnail_path, final_png)
-
         i += 1
 
+    for render in renders:
+        render.result()
+
     return files
 
 
 
+# Verze zpracování - zvýšit při změně pipeline, aby se neplatné výsledky v manifestu přestavěly
+PIPELINE_VERSION = 1
+
+# Odhad paměti zpracování části jako násobek velikosti jejího BIN bloku (dekódované textury, kopie bufferů)
+PART_MEMORY_FACTOR = 4
+
+def _run_part(part: GLTF2, work_path, align_to, render, texture_cache, tiers, instrument):
+    # Běží v podřízeném procesu - zpracování a render jedné části, vrací i naměřené záznamy
+    final_file = process_gltf(part, work_path, align_to, texture_cache=texture_cache, tiers=tiers, instrument=instrument)
+
+    if final_file is None:
+        return None, instrument.records
+
+    if render:
+        png_file = final_file.replace(".glb", ".png")
+        with instrument.stage("render", os.path.getsize(final_file)) as record:
+            call_histruct_renderer(final_file, png_file, 512, 512)
+            record["output_bytes"] = os.path.getsize(png_file) if os.path.exists(png_file) else None
+
+    return final_file, instrument.records
+
+def _split_parts(glb_path, level, instrument):
+    # Části katalogu se vytváří postupně - v hlavním procesu je vždy jen namapovaný katalog
+    # a část čekající na odeslání. Vytvoření každé části se měří jako krok "split".
+    with open_glb(glb_path) as gltf:
+        parts = split_gltf_to_level(gltf, level)
+        while True:
+            with instrument.stage("split") as record:
+                item = next(parts, None)
+                record["output_bytes"] = len(item[1].binary_blob() or b"") if item is not None else 0
+            if item is None:
+                return
+            yield item
+
+def _estimate_part_memory(part: GLTF2):
+    return PART_MEMORY_FACTOR * len(part.binary_blob() or b"")
+
+def _part_outputs(work_path, render, tiers):
+    # Soubory vytvořené zpracováním jedné části (všechny úrovně textur, rozměry, náhled)
+    outputs = [work_path.replace(".glb", suffix + ".glb") for suffix in [tier.suffix for tier in tiers or []] or [""]]
+    outputs.append(work_path.replace(".glb", "_size.txt"))
+    if render:
+        outputs.append(work_path.replace(".glb", ".png"))
+    return outputs
+
+def run_batch(basePath, output_folder, names, level = 2, max_workers = None, max_memory_mb = None, render = True, texture_cache_mb = 2048, tiers = None, thumbnails = None, incremental = True, instrumentation = None):
+    """
+    Zpracuje celé katalogy paralelně. Katalogy se dělí v hlavním procesu postupně a každá
+    vytvořená část se hned rozešle do ProcessPoolExecutor. Výsledné soubory se očíslují a zapíšou do all_models.txt
+    ve stejném pořadí jako při sériovém zpracování (runName).
+
+    Při inkrementálním sestavení se v basePath/temp/build_manifest.json eviduje hash vstupu
+    a parametrů každého kroku. Katalog se stejným zdrojovým GLB se přeskočí celý, u změněného
+    katalogu se znovu zpracují jen části, jejichž obsah se změnil (výsledky částí jsou uložené
+    v basePath/temp/parts podle klíče a do výstupní složky se kopírují).
+
+    :param basePath: Složka se zdrojovými GLB katalogy.
+    :param output_folder: Výstupní složka.
+    :param names: Názvy katalogů (bez přípony .glb).
+    :param level: Úroveň dělení (viz split_gltf_to_level).
+    :param max_workers: Počet procesů (výchozí je počet jader).
+    :param max_memory_mb: Odhadovaný paměťový limit rozpracovaných částí v MB (None = bez limitu).
+                          Při plném limitu se dělení katalogu pozastaví. Do limitu se nepočítá
+                          namapovaný zdrojový katalog a jedna část čekající na odeslání.
+    :param render: Zda generovat náhledy.
+    :param texture_cache_mb: Maximální velikost cache zakódovaných textur v MB.
+    :param tiers: Volitelný seznam TextureTier (viz process_gltf).
+    :param thumbnails: Volitelný ThumbnailWorker - náhledy se pak generují v hlavním procesu
+                       jedním rendererem místo spouštění externího rendereru pro každou část.
+    :param incremental: Přeskočit kroky, jejichž vstupy a parametry se nezměnily.
+    :param instrumentation: Volitelný Instrumentation - záznamy z podřízených procesů se do něj sloučí.
+    :return: Seznam seznamů výstupních souborů pro jednotlivé katalogy.
+    """
+    _check_tiers(tiers)
+
+    budget = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+    align_to = [0, 1, 0]
+    instrumentation = instrumentation or Instrumentation(enabled=False)
+
+    # Cache zakódovaných textur sdílená všemi procesy (adresovaná obsahem, bezpečná pro souběžný zápis)
+    texture_cache = TextureCache(os.path.join(basePath, "temp", "texture_cache"), max_size_mb=texture_cache_mb)
+
+    # Manifest sestavení a úložiště výsledků částí podle klíče
+    manifest = BuildManifest(os.path.join(basePath, "temp", "build_manifest.json")) if incremental else None
+    parts_folder = os.path.join(basePath, "temp", "parts")
+    os.makedirs(parts_folder, exist_ok=True)
+
+    results = {}
+    part_keys = {}
+    submitted = {}
+    renders = []
+    catalogs = []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        used_memory = 0
+
+        def collect(futures):
+            nonlocal used_memory
+            for future in futures:
+                catalog_index, part_index, memory = running.pop(future)
+                results[(catalog_index, part_index)], records = future.result()
+                instrumentation.extend(records)
+                used_memory -= memory
+                if thumbnails is not None and render and results[(catalog_index, part_index)] is not None:
+                    renders.append(thumbnails.submit(results[(catalog_index, part_index)]))
+
+        for catalog_index, name in enumerate(names):
+            glb_path = os.path.join(basePath, name + ".glb")
+
+            catalog_key = stage_key(hash_file(glb_path), version=PIPELINE_VERSION, level=level, align_to=align_to, render=render, tiers=tiers)
+            if manifest is not None and manifest.is_fresh("catalog", name, catalog_key):
+                print(f"Katalog '{name}' se nezměnil, přeskočeno.")
+                catalogs.append((name, catalog_key, None))
+                continue
+
+            split_instrument = instrumentation.child(name)
+            part_count = 0
+
+            for part_index, (_, part) in enumerate(_split_parts(glb_path, level, split_instrument)):
+                part_count += 1
+                part_key = stage_key(hash_gltf(part), version=PIPELINE_VERSION, align_to=align_to, render=render, tiers=tiers)
+                part_keys[(catalog_index, part_index)] = part_key
+                work_path = os.path.join(parts_folder, part_key + ".glb")
+
+                # Nezměněná část - použije se uložený výsledek
+                if manifest is not None and manifest.is_fresh("part", part_key, part_key):
+                    results[(catalog_index, part_index)] = manifest.get("part", part_key)["result"]
+                    continue
+
+                # Stejná část se v jednom běhu zpracuje jen jednou
+                if part_key in submitted:
+                    continue
+                submitted[part_key] = (catalog_index, part_index)
+
+                memory = _estimate_part_memory(part)
+
+                # Čekání na dokončení běžících částí, dokud se nová část nevejde do limitu
+                while running and budget is not None and used_memory + memory > budget:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+                instrument = instrumentation.child(name + "/part" + str(part_index))
+                future = executor.submit(_run_part, part, work_path, align_to, render and thumbnails is None, texture_cache, tiers, instrument)
+                running[future] = (catalog_index, part_index, memory)
+                used_memory += memory
+                del part
+
+            instrumentation.extend(split_instrument.records)
+            catalogs.append((name, catalog_key, part_count))
+
+        collect(list(wait(running).done))
+
+    for part, part_key in part_keys.items():
+        if part not in results:
+            results[part] = results[submitted[part_key]]
+
+    for future in renders:
+        future.result()
+
+    # Kopírování výsledků do výstupní složky s průběžným číslováním v pořadí částí
+    # (stejnou část může použít více katalogů, pracovní soubory se proto jen kopírují)
+    all_files = []
+    work_outputs_used = set()
+    for catalog_index, (name, catalog_key, part_count) in enumerate(catalogs):
+        if part_count is None:
+            all_files.append(manifest.get("catalog", name)["files"])
+            continue
+
+        catalog_folder = os.path.join(output_folder, name)
+        os.makedirs(catalog_folder, exist_ok=True)
+
+        files = []
+        outputs = []
+        used_parts = []
+        i = 1
+        for part_index in range(part_count):
+            part_key = part_keys[(catalog_index, part_index)]
+            used_parts.append(part_key)
+            work_file = results[(catalog_index, part_index)]
+
+            if manifest is not None:
+                work_outputs = _part_outputs(work_file, render, tiers) if work_file is not None else []
+                manifest.record("part", part_key, part_key, work_outputs, result=work_file)
+
+            if work_file is None:
+                continue
+
+            final_name = os.path.join(catalog_folder, name + "_level" + str(level) + "-" + str(i))
+
+            for work_output in _part_outputs(work_file, render, tiers):
+                final_output = final_name + work_output[len(work_file) - len(".glb"):]
+                if os.path.exists(work_output):
+                    shutil.copyfile(work_output, final_output)
+                    work_outputs_used.add(work_output)
+                    outputs.append(final_output)
+
+            files.append(final_name + ".glb")
+            i += 1
+
+        all_files.append(files)
+
+        if manifest is not None:
+            # Výstupy z předchozího sestavení, které už nevznikly (např. katalog má méně částí)
+            previous = manifest.get("catalog", name)
+            for stale in set(previous["outputs"] if previous else []) - set(outputs):
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+            manifest.record("catalog", name, catalog_key, outputs, files=files, parts=used_parts)
+            manifest.save()
+
+    if manifest is None:
+        # Bez inkrementálního sestavení se pracovní soubory po zápisu všech katalogů smažou
+        for work_output in work_outputs_used:
+            os.remove(work_output)
+
+    if manifest is not None:
+        # Výsledky částí, na které už neodkazuje žádný katalog
+        referenced = {part_key for name in manifest.names("catalog") for part_key in manifest.get("catalog", name)["parts"]}
+        for part_key in set(manifest.names("part")) - referenced:
+            for path in manifest.remove("part", part_key)["outputs"]:
+                if os.path.exists(path):
+                    os.remove(path)
+        manifest.save()
+
+    return all_files
+
+
 if __name__ == "__main__":
     
     basePath = "..\\"
@@ -115,10 +450,6 @@ if __name__ == "__main__":
 
     output_files_file_path = os.path.join(output_folder, "all_models.txt")
 
-    # save generated file paths to txt file
-    with open(output_files_file_path, "w") as file:
-        file.write("")
-
     names = [
         "ExteriorAccessories_10152024_01",
         "ExteriorPlanters_10102024_01",
@@ -133,12 +464,16 @@ if __name__ == "__main__":
         "LargeGlass_10152024_01"
     ]
 
-    for name in names:
-        files = runName(basePath, output_folder, name)
+    # Měření kroků (profile_dir=... pro výstupy cProfile)
+    instrumentation = Instrumentation()
+
+    all_files = run_batch(basePath, output_folder, names, max_workers=os.cpu_count(), max_memory_mb=16 * 1024, instrumentation=instrumentation)
+
+    instrumentation.write_report(os.path.join(output_folder, "build_report"))
 
-        with open(output_files_file_path, "a") as file:
+    # save generated file paths to txt file
+    with open(output_files_file_path, "w") as file:
+        for files in all_files:
             for f in files:
                 file.write(f + "\n")
             file.write("\n")
-
-
@@ -1,54 +1,85 @@
-from pygltflib import GLTF2, Node
+from pygltflib import GLTF2, Node, Buffer, Scene
+from dataclasses import dataclass, replace
 import copy
 import os
 import numpy as np
-from scipy.spatial.transform import Rotation as R
-
-
-def trs_to_matrix(translation, rotation = None, scale = None):
-    """Převede translation, rotation, scale na transformační matici"""
-    matrix = np.identity(4)
-    # Přidání měřítka
-    if scale is not None:
-        scale_matrix = np.diag(scale + [1])
-        matrix = np.dot(matrix, scale_matrix)
-    # Přidání rotace (kvaternion na rotační matici)
-    if rotation is not None:
-        rotation_matrix = R.from_quat(rotation).as_matrix()
-        matrix[:3, :3] = np.dot(matrix[:3, :3], rotation_matrix)
-    # Přidání posunu
-    if translation is not None:
-        matrix[:3, 3] = translation
-    return matrix
+
+from accessors import get_buffer_bytes
+from glb_io import load_glb, open_glb, save_glb
+from transforms import get_world_matrices, matrix_to_list, node_matrix
+from optimize import find_empty_nodes, get_node_accessors, get_primitive_accessors, get_texture_infos, get_texture_info_index, get_texture_sources, remap_node_accessors, remap_primitive_accessors, remap_texture_infos, remap_texture_sources
+
 
 def combine_transforms(parent: Node, child: Node):
     """Kombinace transformací parent a child uzlu (matrix nebo TRS)"""
+    return matrix_to_list(np.dot(node_matrix(parent), node_matrix(child)))
 
-    parent_matrix = np.transpose(np.array(parent.matrix).reshape(4, 4)) if parent.matrix else trs_to_matrix(
-        parent.translation or [0, 0, 0],
-        parent.rotation or [0, 0, 0, 1],
-        parent.scale or [1, 1, 1],
-    )
+@dataclass
+class SubtreeStats:
+    """Souhrnné údaje o podstromu uzlu (včetně uzlu samotného)."""
+    empty: bool = True
+    meshes: int = 0
+    primitives: int = 0
+    vertices: int = 0
+    triangles: int = 0
 
-    child_matrix = np.transpose(np.array(child.matrix).reshape(4, 4)) if child.matrix else trs_to_matrix(
-        child.translation or [0, 0, 0],
-        child.rotation or [0, 0, 0, 1],
-        child.scale or [1, 1, 1],
-    )
+def _mesh_stats(gltf: GLTF2, mesh_index):
+    # Počet primitiv, vrcholů a trojúhelníků jednoho meshe
+    stats = SubtreeStats(empty=False, meshes=1)
+    for primitive in gltf.meshes[mesh_index].primitives:
+        stats.primitives += 1
+        position = getattr(primitive.attributes, "POSITION", None)
+        vertices = gltf.accessors[position].count if position is not None else 0
+        elements = gltf.accessors[primitive.indices].count if primitive.indices is not None else vertices
+        stats.vertices += vertices
+        mode = 4 if primitive.mode is None else primitive.mode
+        if mode == 4:
+            stats.triangles += elements // 3
+        elif mode in (5, 6):
+            stats.triangles += max(elements - 2, 0)
+    return stats
 
-    combined_matrix = np.dot(parent_matrix, child_matrix)
+def build_subtree_index(gltf: GLTF2):
+    """
+    Vytvoří index souhrnných údajů podstromů všech uzlů jedním post-order průchodem.
+    Prázdnost uzlů se přebírá z find_empty_nodes (stejné pravidlo jako collect_garbage).
 
-    return np.transpose(combined_matrix).flatten().tolist()
+    :return: Seznam SubtreeStats indexovaný indexem uzlu.
+    """
+    empty = find_empty_nodes(gltf)
+    mesh_stats = {}
+    index = [None] * len(gltf.nodes)
 
-def node_is_empty(gltf: GLTF2, node_index: int) -> bool:
-    node = gltf.nodes[node_index]
-    # A node is empty if it has no mesh, and no children or all children are empty
-    return (
-        node.mesh is None and (
-            len(node.children) == 0 or
-            all(node_is_empty(gltf, child) for child in node.children)
-        )
-    )
+    for root in range(len(gltf.nodes)):
+        if index[root] is not None:
+            continue
+        stack = [(root, False)]
+        while stack:
+            node_index, children_done = stack.pop()
+            node = gltf.nodes[node_index]
+            if not children_done:
+                stack.append((node_index, True))
+                stack.extend((child, False) for child in node.children if index[child] is None)
+                continue
+
+            stats = SubtreeStats()
+            if node.mesh is not None:
+                if node.mesh not in mesh_stats:
+                    mesh_stats[node.mesh] = _mesh_stats(gltf, node.mesh)
+                stats = replace(mesh_stats[node.mesh])
+            stats.empty = empty[node_index]
+            for child in node.children:
+                child_stats = index[child]
+                stats.meshes += child_stats.meshes
+                stats.primitives += child_stats.primitives
+                stats.vertices += child_stats.vertices
+                stats.triangles += child_stats.triangles
+            index[node_index] = stats
+
+    return index
+
+def _describe(stats: SubtreeStats):
+    return f"{stats.meshes} meshes, {stats.primitives} primitiv, {stats.vertices} vrcholů, {stats.triangles} trojúhelníků"
 
 # Funkce na validaci indexů a přečíslování
 def remap_indices(nodes, valid_indices):
@@ -67,37 +98,179 @@ def filter_nodes(gltf: GLTF2, node_index, kept_nodes):
         for child in node.children:
             filter_nodes(gltf, child, kept_nodes)
 
-def filter_nodes_from_root(gltf: GLTF2, node_index, output_dir, output_filename):
-    new_gltf = copy.deepcopy(gltf)
+def _index_map(indices):
+    return {old: new for new, old in enumerate(sorted(indices))}
 
-    root_node = new_gltf.nodes[node_index]
-    new_scene_nodes = gltf.nodes[node_index].children
+def extract_part(gltf: GLTF2, scene_nodes, matrices = None) -> GLTF2:
+    """
+    Vytvoří nový GLTF objekt obsahující pouze uzly z podstromů zadaných uzlů a jen ta data
+    (meshes, materiály, textury, obrázky, accessors, bufferViews), která z nich vedou.
+    Binární data se skládají do nového kompaktního BIN bloku, zdrojový objekt se nekopíruje.
 
+    :param gltf: Zdrojový GLTF objekt.
+    :param scene_nodes: Indexy uzlů, které budou kořenovými uzly scény nového souboru.
+    :param matrices: Volitelné transformační matice (sloupcově, 16 hodnot) pro kořenové uzly.
+    :return: Nový GLTF objekt.
+    """
     kept_nodes = set()
-    for node in new_scene_nodes:
+    for node in scene_nodes:
         filter_nodes(gltf, node, kept_nodes)
+    node_map = _index_map(kept_nodes)
+
+    # Shromáždění dat dosažitelných z uzlů
+    used_meshes, used_skins, used_cameras = set(), set(), set()
+    used_materials, used_accessors = set(), set()
+    for node_index in kept_nodes:
+        node = gltf.nodes[node_index]
+        if node.mesh is not None:
+            used_meshes.add(node.mesh)
+        if node.skin is not None:
+            used_skins.add(node.skin)
+        if node.camera is not None:
+            used_cameras.add(node.camera)
+        used_accessors.update(get_node_accessors(node))
+
+    for mesh_index in used_meshes:
+        for primitive in gltf.meshes[mesh_index].primitives:
+            if primitive.material is not None:
+                used_materials.add(primitive.material)
+            used_accessors.update(get_primitive_accessors(primitive))
 
-    # Filtrování uzlů na základě zachovaných indexů
-    valid_indices = sorted(kept_nodes)
-    new_gltf.nodes = [node for i, node in enumerate(new_gltf.nodes) if i in kept_nodes]
+    for skin_index in used_skins:
+        if gltf.skins[skin_index].inverseBindMatrices is not None:
+            used_accessors.add(gltf.skins[skin_index].inverseBindMatrices)
+
+    used_textures = set()
+    for material_index in used_materials:
+        used_textures.update(get_texture_info_index(info) for info in get_texture_infos(gltf.materials[material_index]))
+
+    used_images, used_samplers = set(), set()
+    for texture_index in used_textures:
+        texture = gltf.textures[texture_index]
+        used_images.update(get_texture_sources(texture))
+        if texture.sampler is not None:
+            used_samplers.add(texture.sampler)
+
+    used_buffer_views = set()
+    for accessor_index in used_accessors:
+        accessor = gltf.accessors[accessor_index]
+        if accessor.bufferView is not None:
+            used_buffer_views.add(accessor.bufferView)
+        if accessor.sparse:
+            used_buffer_views.add(accessor.sparse.indices.bufferView)
+            used_buffer_views.add(accessor.sparse.values.bufferView)
+    for image_index in used_images:
+        if gltf.images[image_index].bufferView is not None:
+            used_buffer_views.add(gltf.images[image_index].bufferView)
+
+    mesh_map, skin_map, camera_map = _index_map(used_meshes), _index_map(used_skins), _index_map(used_cameras)
+    material_map, accessor_map = _index_map(used_materials), _index_map(used_accessors)
+    texture_map, image_map, sampler_map = _index_map(used_textures), _index_map(used_images), _index_map(used_samplers)
+    buffer_view_map = _index_map(used_buffer_views)
+
+    def take(items, index_map):
+        return [copy.deepcopy(items[old]) for old in sorted(index_map)]
+
+    part = GLTF2(
+        asset=copy.deepcopy(gltf.asset),
+        extensionsUsed=list(gltf.extensionsUsed),
+        extensionsRequired=list(gltf.extensionsRequired),
+        nodes=take(gltf.nodes, node_map),
+        meshes=take(gltf.meshes, mesh_map),
+        skins=take(gltf.skins, skin_map),
+        cameras=take(gltf.cameras, camera_map),
+        materials=take(gltf.materials, material_map),
+        accessors=take(gltf.accessors, accessor_map),
+        textures=take(gltf.textures, texture_map),
+        images=take(gltf.images, image_map),
+        samplers=take(gltf.samplers, sampler_map),
+        bufferViews=take(gltf.bufferViews, buffer_view_map),
+    )
 
     # Přečíslování referencí
-    index_map = remap_indices(new_gltf.nodes, valid_indices)
+    for node in part.nodes:
+        node.children = [node_map[child] for child in node.children if child in node_map]
+        if node.mesh is not None:
+            node.mesh = mesh_map[node.mesh]
+        if node.skin is not None:
+            node.skin = skin_map[node.skin]
+        if node.camera is not None:
+            node.camera = camera_map[node.camera]
+        remap_node_accessors(node, accessor_map)
+
+    for skin in part.skins:
+        skin.joints = [node_map[joint] for joint in skin.joints if joint in node_map]
+        skin.skeleton = node_map.get(skin.skeleton)
+        if skin.inverseBindMatrices is not None:
+            skin.inverseBindMatrices = accessor_map[skin.inverseBindMatrices]
+
+    for mesh in part.meshes:
+        for primitive in mesh.primitives:
+            if primitive.material is not None:
+                primitive.material = material_map[primitive.material]
+            remap_primitive_accessors(primitive, accessor_map)
+
+    for material in part.materials:
+        remap_texture_infos(material, texture_map)
+
+    for texture in part.textures:
+        remap_texture_sources(texture, image_map)
+        if texture.sampler is not None:
+            texture.sampler = sampler_map[texture.sampler]
+
+    for image in part.images:
+        if image.bufferView is not None:
+            image.bufferView = buffer_view_map[image.bufferView]
+
+    for accessor in part.accessors:
+        if accessor.bufferView is not None:
+            accessor.bufferView = buffer_view_map[accessor.bufferView]
+        if accessor.sparse:
+            accessor.sparse.indices.bufferView = buffer_view_map[accessor.sparse.indices.bufferView]
+            accessor.sparse.values.bufferView = buffer_view_map[accessor.sparse.values.bufferView]
 
-    # Aktualizace transformace child uzlu
-    for index in new_scene_nodes:
-        child_node = new_gltf.nodes[index_map[index]]
-        transformation_matrix = combine_transforms(root_node, child_node)
-        child_node.matrix = transformation_matrix
-        child_node.translation, child_node.rotation, child_node.scale = None, None, None
+    # Kopírování jen použitých úseků bufferů do nového BIN bloku
+    buffers = {}
+    blob = bytearray()
+    for buffer_view in part.bufferViews:
+        if buffer_view.buffer not in buffers:
+            buffers[buffer_view.buffer] = get_buffer_bytes(gltf, buffer_view.buffer)
+        data = buffers[buffer_view.buffer]
+        start = buffer_view.byteOffset or 0
+        blob.extend(b"\0" * (-len(blob) % 4))
+        buffer_view.byteOffset = len(blob)
+        buffer_view.buffer = 0
+        blob.extend(data[start:start + buffer_view.byteLength])
+
+    part.buffers = [Buffer(byteLength=len(blob))]
+    part.set_binary_blob(bytes(blob))
 
     # Aktualizace root uzlů scény
-    new_gltf.scenes[0].nodes = [index_map[node] for node in new_scene_nodes]
+    part.scenes = [Scene(nodes=[node_map[node] for node in scene_nodes])]
+    part.scene = 0
+
+    if matrices is not None:
+        for node_index, matrix in zip(part.scenes[0].nodes, matrices):
+            node = part.nodes[node_index]
+            node.matrix = matrix
+            node.translation, node.rotation, node.scale = None, None, None
+
+    return part
+
+def filter_nodes_from_root(gltf: GLTF2, node_index, output_dir, output_filename):
+    root_node = gltf.nodes[node_index]
+    new_scene_nodes = root_node.children
+
+    # Aktualizace transformace child uzlů (světová matice, root uzel je kořenem scény)
+    world = get_world_matrices(gltf)
+    matrices = [matrix_to_list(world[index]) for index in new_scene_nodes]
+
+    new_gltf = extract_part(gltf, new_scene_nodes, matrices)
 
     # Uložit nový GLB soubor
     name = root_node.name or f"node{node_index}"
     output_path = os.path.join(output_dir, output_filename + f"-{name}.glb")
-    new_gltf.save(output_path)
+    save_glb(new_gltf, output_path)
 
     print(f"Uložen nový soubor: {output_path}")
 
@@ -105,7 +278,7 @@ def filter_nodes_from_root(gltf: GLTF2, node_index, output_dir, output_filename)
 
 def split_glb_by_root_nodes(input_glb_path, output_dir, output_filename):
     # Načtení GLB souboru
-    gltf = GLTF2().load(input_glb_path)
+    gltf = load_glb(input_glb_path)
 
     # Zajištění výstupního adresáře
     os.makedirs(output_dir, exist_ok=True)
@@ -118,19 +291,80 @@ def split_glb_by_root_nodes(input_glb_path, output_dir, output_filename):
         print(f"Scéna v souboru '{input_glb_path}' neobsahuje žádné uzly.")
         return output_files
 
+    subtree_index = build_subtree_index(gltf)
+
     for scene_node_index in gltf.scenes[0].nodes:
         scene_node = gltf.nodes[scene_node_index]
         
         # Pokud root node nemá children, pokračujte na další root node
-        if node_is_empty(gltf, scene_node_index):
+        if subtree_index[scene_node_index].empty:
             print(f"Uzel scény s indexem '{scene_node_index}' ({scene_node.name}) je prázdný, přeskočeno.")
             continue
 
+        print(f"Uzel scény s indexem '{scene_node_index}' ({scene_node.name}): {_describe(subtree_index[scene_node_index])}.")
+
         output_path = filter_nodes_from_root(gltf, scene_node_index, output_dir, output_filename)
         output_files.append(output_path)
 
     return output_files
 
+def split_gltf_to_level(gltf: GLTF2, level: int):
+    """
+    Rozdělí GLTF objekt až do zadané úrovně hierarchie v jednom průchodu, bez mezisouborů.
+    Úroveň 0 odpovídá split_glb_by_root_nodes, každá další úroveň opakuje dělení na výsledných
+    částech. Do kořenových uzlů částí se zapečou jejich světové matice (get_world_matrices).
+
+    Části se vytváří postupně (generátor), v paměti tak nemusí být všechny najednou.
+    Zdrojový GLTF objekt musí zůstat načtený, dokud se části procházejí.
+
+    :param gltf: Načtený GLTF objekt.
+    :param level: Cílová úroveň dělení (0 = dělení podle root uzlů scény).
+    :return: Generátor dvojic (název uzlu, GLTF objekt části).
+    """
+    subtree_index = build_subtree_index(gltf)
+    world = get_world_matrices(gltf)
+
+    frontier = list(gltf.scenes[0].nodes)
+
+    for current_level in range(level + 1):
+        print(f"Úroveň {current_level}: {len(frontier)} uzlů.")
+
+        next_frontier = []
+        for node_index in frontier:
+
+            # Prázdné uzly se přeskakují stejně jako v split_glb_by_root_nodes
+            if subtree_index[node_index].empty:
+                print(f"Uzel s indexem '{node_index}' ({gltf.nodes[node_index].name}) je prázdný, přeskočeno.")
+                continue
+
+            children = gltf.nodes[node_index].children
+
+            if current_level < level:
+                next_frontier.extend(children)
+                continue
+
+            name = gltf.nodes[node_index].name or f"node{node_index}"
+            print(f"Část '{name}': {_describe(subtree_index[node_index])}.")
+            yield name, extract_part(gltf, children, [matrix_to_list(world[child]) for child in children])
+
+        frontier = next_frontier
+
+def split_glb_to_level(input_glb_path, output_dir, output_filename, level):
+    """
+    Načte GLB soubor jednou a uloží pouze části cílové úrovně (viz split_gltf_to_level).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    output_files = []
+    with open_glb(input_glb_path) as gltf:
+        for name, part in split_gltf_to_level(gltf, level):
+            output_path = os.path.join(output_dir, output_filename + f"_level{level}-{name}.glb")
+            save_glb(part, output_path)
+            print(f"Uložen nový soubor: {output_path}")
+            output_files.append(output_path)
+
+    return output_files
+
 if __name__ == "__main__":
 
     path = r"..\temp\RegularDoors_10152024_01\RegularDoors_10152024_01_level0-1.glb"
@@ -0,0 +1,121 @@
+from pygltflib import GLTF2, Scene, Node, Mesh, Primitive, Attributes, Buffer, BufferView, Material, PbrMetallicRoughness, TextureInfo, Texture, Image, Sampler
+from PIL import Image as PILImage
+import io
+import sys
+import numpy as np
+
+from accessors import add_accessor
+from glb_io import save_glb
+
+def _box(size = 1.0, segments = 1):
+    # Kvádr se stěnami rozdělenými na segments x segments čtverců (12 * segments^2 trojúhelníků)
+    s = size / 2
+    positions, normals, uvs, indices = [], [], [], []
+    faces = [
+        ([1, 0, 0], [0, 1, 0], [0, 0, 1]), ([-1, 0, 0], [0, 1, 0], [0, 0, -1]),
+        ([0, 1, 0], [0, 0, 1], [1, 0, 0]), ([0, -1, 0], [0, 0, -1], [1, 0, 0]),
+        ([0, 0, 1], [1, 0, 0], [0, 1, 0]), ([0, 0, -1], [-1, 0, 0], [0, 1, 0]),
+    ]
+    grid = np.linspace(0, 1, segments + 1)
+    a, b = [g.ravel() for g in np.meshgrid(grid, grid, indexing="ij")]
+    i, j = [g.ravel() for g in np.meshgrid(np.arange(segments), np.arange(segments), indexing="ij")]
+    for face_index, (n, u, v) in enumerate(faces):
+        n, u, v = np.array(n), np.array(u), np.array(v)
+        positions.append(n * s + ((a - 0.5) * 2 * s)[:, None] * u + ((b - 0.5) * 2 * s)[:, None] * v)
+        normals.append(np.tile(n, (len(a), 1)))
+        uvs.append(np.stack([a, b], axis=1))
+        k = face_index * len(a) + i * (segments + 1) + j
+        indices.append(np.stack([k, k + segments + 1, k + 1, k + 1, k + segments + 1, k + segments + 2], axis=1).ravel())
+    return (
+        np.concatenate(positions).astype(np.float32),
+        np.concatenate(normals).astype(np.float32),
+        np.concatenate(uvs).astype(np.float32),
+        np.concatenate(indices).astype(np.uint32),
+    )
+
+def generate(roots = 2, depth = 3, children = 2, meshes = 3, segments = 2, duplicates = 0, textures = 2, texture_size = 256, seed = 0):
+    """
+    Vytvoří syntetický GLTF objekt pro testy a benchmarky.
+
+    Hierarchie: roots kořenových uzlů, každý uzel do hloubky depth má children potomků a listy
+    nesou meshe (uzly mají různé kombinace translation / rotation / scale). Na konec scény
+    se přidá prázdný uzel.
+
+    :param roots: Počet kořenových uzlů scény.
+    :param depth: Hloubka hierarchie.
+    :param children: Počet potomků každého vnitřního uzlu.
+    :param meshes: Počet různých meshů (kvádry různé velikosti).
+    :param segments: Dělení stěn kvádru - každý mesh má 12 * segments^2 trojúhelníků.
+    :param duplicates: Počet kopií každého meshe se stejnými daty v samostatných bufferViews
+                       (pro deduplikaci).
+    :param textures: Počet textur (střídavě PNG a JPEG s šumem).
+    :param texture_size: Velikost textury v pixelech.
+    :param seed: Semínko generátoru náhodných čísel.
+    :return: GLTF objekt s binárním blobem.
+    """
+    gltf = GLTF2(buffers=[Buffer()])
+    blob = bytearray()
+    rng = np.random.default_rng(seed)
+
+    gltf.samplers.append(Sampler())
+    for texture_index in range(textures):
+        pixels = (rng.random((texture_size, texture_size, 3)) * 255).astype(np.uint8)
+        image_format = "PNG" if texture_index % 2 == 0 else "JPEG"
+        output = io.BytesIO()
+        PILImage.fromarray(pixels).save(output, format=image_format)
+
+        blob.extend(b"\0" * (-len(blob) % 4))
+        gltf.bufferViews.append(BufferView(buffer=0, byteOffset=len(blob), byteLength=len(output.getvalue())))
+        blob.extend(output.getvalue())
+        gltf.images.append(Image(bufferView=len(gltf.bufferViews) - 1, mimeType="image/" + image_format.lower()))
+        gltf.textures.append(Texture(source=texture_index, sampler=0))
+
+    for mesh_index in range(meshes):
+        gltf.materials.append(Material(pbrMetallicRoughness=PbrMetallicRoughness(
+            baseColorTexture=TextureInfo(index=mesh_index % textures) if textures else None)))
+
+        positions, normals, uvs, indices = _box(1.0 + mesh_index, segments)
+        for _ in range(duplicates + 1):
+            attributes = Attributes(
+                POSITION=add_accessor(gltf, blob, positions, target=34962, min_max=True),
+                NORMAL=add_accessor(gltf, blob, normals, target=34962),
+                TEXCOORD_0=add_accessor(gltf, blob, uvs, target=34962),
+            )
+            gltf.meshes.append(Mesh(primitives=[Primitive(
+                attributes=attributes,
+                indices=add_accessor(gltf, blob, indices, target=34963),
+                material=mesh_index,
+            )]))
+
+    def make(level):
+        node_index = len(gltf.nodes)
+        gltf.nodes.append(Node(
+            name=f"n{node_index}",
+            translation=[float(node_index % 5), 0.5 * level, 0.0],
+            rotation=[0.0, 0.3826834, 0.0, 0.9238795] if node_index % 3 == 0 else None,
+            scale=[1.0, 2.0, 1.0] if node_index % 4 == 0 else None,
+        ))
+        if level == depth:
+            gltf.nodes[node_index].mesh = node_index % len(gltf.meshes)
+        else:
+            gltf.nodes[node_index].children = [make(level + 1) for _ in range(children)]
+        return node_index
+
+    gltf.scenes = [Scene(nodes=[make(0) for _ in range(roots)])]
+
+    # Prázdný uzel
+    gltf.nodes.append(Node(name="empty"))
+    gltf.scenes[0].nodes.append(len(gltf.nodes) - 1)
+    gltf.scene = 0
+
+    gltf.buffers[0].byteLength = len(blob)
+    gltf.set_binary_blob(bytes(blob))
+
+    return gltf
+
+
+if __name__ == "__main__":
+
+    output_path = (len(sys.argv) > 1 and sys.argv[1]) or "synthetic.glb"
+
+    save_glb(generate(), output_path)
@@ -0,0 +1,100 @@
+import asyncio
+
+from addContentDisposition import MAX_RETRIES, get_content_disposition, set_content_disposition_for_blobs
+from conftest import FakeContentSettings
+
+PREFIX = "venly/models/"
+
+
+def run(container, **kwargs):
+    return asyncio.run(set_content_disposition_for_blobs(container, folder_path=PREFIX, **kwargs))
+
+
+def test_skips_blobs_from_listing(container):
+    container.add_blob(PREFIX + "a.glb", content_type="model/gltf-binary")
+    container.add_blob(PREFIX + "b.glb", content_type="model/gltf-binary", content_disposition="attachment; filename=\"b.glb\"")
+    container.add_blob("other/c.glb")
+
+    stats = run(container)
+
+    assert stats == {"updated": 1, "skipped": 1, "failed": 0}
+    # Přeskočení podle výpisu - vlastnosti jednotlivých blobů se nenačítají
+    assert container.calls["get_blob_properties"] == 0
+    assert container.calls["set_http_headers"] == 1
+    settings = container.blobs[PREFIX + "a.glb"]["content_settings"]
+    assert settings.content_disposition == get_content_disposition(PREFIX + "a.glb")
+    assert settings.content_type == "model/gltf-binary"
+    assert container.blobs["other/c.glb"]["content_settings"].content_disposition is None
+    assert not container.closed
+
+
+def test_retries_transient_errors(container, sleeps):
+    container.add_blob(PREFIX + "a.glb")
+    container.failures[("set_http_headers", PREFIX + "a.glb")] = [503, 503]
+
+    stats = run(container)
+
+    assert stats == {"updated": 1, "skipped": 0, "failed": 0}
+    assert container.calls["set_http_headers"] == 3
+    assert len(sleeps) == 2
+    assert container.blobs[PREFIX + "a.glb"]["content_settings"].content_disposition
+
+
+def test_gives_up_after_retries_and_on_permanent_errors(container, sleeps):
+    container.add_blob(PREFIX + "a.glb")
+    container.add_blob(PREFIX + "b.glb")
+    container.failures[("set_http_headers", PREFIX + "a.glb")] = [503] * (MAX_RETRIES + 1)
+    container.failures[("set_http_headers", PREFIX + "b.glb")] = [403]
+
+    stats = run(container)
+
+    assert stats == {"updated": 0, "skipped": 0, "failed": 2}
+    assert container.calls["set_http_headers"] == MAX_RETRIES + 2
+    assert len(sleeps) == MAX_RETRIES
+
+
+def test_rereads_blob_changed_after_listing(container):
+    # Jiný klient mezitím změnil Content-Type - zápis s etagem z výpisu selže (412),
+    # načtou se aktuální vlastnosti a novější hlavičky se zachovají
+    container.add_blob(PREFIX + "a.glb", content_type="application/octet-stream")
+    container.concurrent_updates[PREFIX + "a.glb"] = FakeContentSettings(content_type="model/gltf-binary")
+
+    stats = run(container)
+
+    assert stats == {"updated": 1, "skipped": 0, "failed": 0}
+    assert container.calls["get_blob_properties"] == 1
+    settings = container.blobs[PREFIX + "a.glb"]["content_settings"]
+    assert settings.content_type == "model/gltf-binary"
+    assert settings.content_disposition == get_content_disposition(PREFIX + "a.glb")
+
+
+def test_skips_blob_that_got_disposition_after_listing(container):
+    container.add_blob(PREFIX + "a.glb")
+    container.concurrent_updates[PREFIX + "a.glb"] = FakeContentSettings(content_disposition="inline")
+
+    stats = run(container)
+
+    assert stats == {"updated": 0, "skipped": 1, "failed": 0}
+    assert container.blobs[PREFIX + "a.glb"]["content_settings"].content_disposition == "inline"
+
+
+def test_limits_concurrency(container, monkeypatch):
+    for i in range(50):
+        container.add_blob(PREFIX + f"m{i}.glb")
+
+    active = {"now": 0, "max": 0}
+    set_http_headers = type(container.get_blob_client("")).set_http_headers
+
+    async def tracked(self, content_settings, if_match = None):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.001)
+        active["now"] -= 1
+        await set_http_headers(self, content_settings, if_match)
+
+    monkeypatch.setattr(type(container.get_blob_client("")), "set_http_headers", tracked)
+
+    stats = run(container, max_concurrency=4)
+
+    assert stats["updated"] == 50
+    assert 1 < active["max"] <= 4
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pytest
+from pygltflib import GLTF2, Buffer, Mesh, Node, Primitive, Scene
+
+from accessors import add_accessor
+from glb_io import save_glb
+from script import run_batch
+
+
+def make_catalog(roots = 2, children = 2, leaves = 2):
+    # Katalog roots x children uzlů, listy nesou trojúhelník - na úrovni 1 vznikne roots * children částí
+    gltf = GLTF2(buffers=[Buffer()], scenes=[Scene()], scene=0)
+    blob = bytearray()
+
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32)
+    mesh = Mesh(primitives=[Primitive(attributes={"POSITION": add_accessor(gltf, blob, positions, target=34962, min_max=True)})])
+    gltf.meshes.append(mesh)
+
+    def add_node(node):
+        gltf.nodes.append(node)
+        return len(gltf.nodes) - 1
+
+    for root in range(roots):
+        root_children = []
+        for child in range(children):
+            leaf_nodes = [add_node(Node(name=f"leaf{root}{child}{leaf}", mesh=0, translation=[leaf, child, root])) for leaf in range(leaves)]
+            root_children.append(add_node(Node(name=f"node{root}{child}", children=leaf_nodes)))
+        gltf.scenes[0].nodes.append(add_node(Node(name=f"root{root}", children=root_children)))
+
+    gltf.buffers[0].byteLength = len(blob)
+    gltf.set_binary_blob(bytes(blob))
+    return gltf
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_identical_catalogs(tmp_path, incremental):
+    # Dva katalogy se stejnými částmi - každá část se zpracuje jednou, ale zapíše se do obou
+    catalog = make_catalog()
+    save_glb(catalog, str(tmp_path / "A.glb"))
+    save_glb(catalog, str(tmp_path / "B.glb"))
+
+    all_files = run_batch(str(tmp_path), str(tmp_path / "output"), ["A", "B"], level=1, max_workers=2, render=False, incremental=incremental)
+
+    assert [len(files) for files in all_files] == [4, 4]
+    for files in all_files:
+        for path in files:
+            assert os.path.exists(path)
+            assert os.path.exists(path.replace(".glb", "_size.txt"))
+
+    parts_folder = tmp_path / "temp" / "parts"
+    assert bool(os.listdir(parts_folder)) == incremental
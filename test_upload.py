@@ -0,0 +1,81 @@
+import asyncio
+import hashlib
+
+import pytest
+
+import upload
+from addContentDisposition import get_content_disposition
+from conftest import FakeContentSettings
+
+PREFIX = "venly/models/"
+
+
+@pytest.fixture(autouse=True)
+def content_settings(monkeypatch):
+    # Bez azure SDK - nastavení obsahu z testovací náhrady
+    monkeypatch.setattr(upload, "make_content_settings", FakeContentSettings)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    (tmp_path / "A").mkdir()
+    (tmp_path / "A" / "part.glb").write_bytes(b"glTF" + bytes(100))
+    (tmp_path / "A" / "part.png").write_bytes(b"\x89PNG")
+    (tmp_path / "A" / "part_size.txt").write_text("1 MB")
+    (tmp_path / "A" / "notes.md").write_text("ignored")
+    return tmp_path
+
+
+def run(folder, container):
+    return asyncio.run(upload.upload_folder(str(folder), container, prefix=PREFIX))
+
+
+def test_uploads_with_headers(folder, container):
+    stats = run(folder, container)
+
+    assert stats == {"uploaded": 3, "skipped": 0, "failed": 0}
+    assert sorted(container.blobs) == [PREFIX + "A/part.glb", PREFIX + "A/part.png", PREFIX + "A/part_size.txt"]
+
+    blob = container.blobs[PREFIX + "A/part.glb"]
+    assert blob["data"] == b"glTF" + bytes(100)
+    assert blob["content_settings"].content_type == "model/gltf-binary"
+    assert blob["content_settings"].content_disposition == get_content_disposition(PREFIX + "A/part.glb")
+    assert bytes(blob["content_settings"].content_md5) == hashlib.md5(blob["data"]).digest()
+
+
+def test_skips_unchanged_files_by_md5(folder, container):
+    run(folder, container)
+    assert container.calls["upload_blob"] == 3
+
+    # Beze změny se nic nenahrává
+    stats = run(folder, container)
+    assert stats == {"uploaded": 0, "skipped": 3, "failed": 0}
+    assert container.calls["upload_blob"] == 3
+
+    # Nahraje se jen změněný soubor
+    (folder / "A" / "part.png").write_bytes(b"\x89PNG changed")
+    stats = run(folder, container)
+    assert stats == {"uploaded": 1, "skipped": 2, "failed": 0}
+    assert container.blobs[PREFIX + "A/part.png"]["data"] == b"\x89PNG changed"
+
+
+def test_uploads_blob_without_md5(folder, container):
+    # Blob nahraný bez Content-MD5 (např. jiným nástrojem) se nahraje znovu
+    container.add_blob(PREFIX + "A/part.png", data=b"\x89PNG")
+
+    stats = run(folder, container)
+
+    assert stats == {"uploaded": 3, "skipped": 0, "failed": 0}
+
+
+def test_retries_transient_errors(folder, container, sleeps):
+    container.failures[("upload_blob", PREFIX + "A/part.glb")] = [503]
+    container.failures[("upload_blob", PREFIX + "A/part.png")] = [403]
+
+    stats = run(folder, container)
+
+    assert stats == {"uploaded": 2, "skipped": 0, "failed": 1}
+    assert len(sleeps) == 1
+    # Opakovaný pokus odešle soubor znovu od začátku
+    assert container.blobs[PREFIX + "A/part.glb"]["data"] == b"glTF" + bytes(100)
+    assert PREFIX + "A/part.png" not in container.blobs
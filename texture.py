@@ -1,39 +1,99 @@
-from pygltflib import GLTF2
+from pygltflib import GLTF2, DATA_URI_HEADER
 from PIL import Image
+from bisect import bisect_right
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import base64
+import copy
 import io
 
+from accessors import get_buffer_bytes
+from texture_cache import TextureCache
+
 def get_buffer_data(gltf: GLTF2):
     """
-    Načte binární data bufferů do paměti.
+    Vrátí binární data bufferů jako memoryview bez kopírování.
 
     :param gltf: GLTF objekt obsahující buffery.
     """
-    # Rozlišení mezi GLB a GLTF
-    if hasattr(gltf, '_glb_data') and gltf._glb_data is not None:
-        # Práce s `_glb_data`
-        buffer_data = [bytearray(gltf._glb_data)]
-    else:
-        # Práce s více buffery v GLTF
-        buffer_data = [bytearray(buffer.data) for buffer in gltf.buffers]
+    return [memoryview(get_buffer_bytes(gltf, i)) for i in range(len(gltf.buffers))]
+
+
+def rebuild_buffer(data, buffer_views, replacements):
+    """
+    Sestaví nový buffer v jednom průchodu: data nahrazených bufferViews se zapíší na jejich
+    původní místo, ostatní data se zkopírují beze změny a posunou se o rozdíl délek.
+    Každá náhrada se doplní nulami tak, aby byl posun násobkem 4 - zarovnání všech
+    následujících dat (accessors) tak zůstane zachováno.
+
+    :param data: Původní data bufferu (bytes nebo memoryview).
+    :param buffer_views: Slovník index -> bufferView pro všechny bufferViews tohoto bufferu.
+    :param replacements: Slovník index bufferView -> nová data.
+    :return: Nová data bufferu (bytearray).
+    """
+    old_offsets = {index: buffer_view.byteOffset or 0 for index, buffer_view in buffer_views.items()}
+    replaced = sorted(replacements, key=lambda index: old_offsets[index])
+
+    # Posuny ostatních bufferViews podle nahrazených úseků před nimi
+    ends = []
+    deltas = []
+    delta = 0
+    for index in replaced:
+        old_length = buffer_views[index].byteLength
+        padding = (old_length - len(replacements[index])) % 4
+        delta += len(replacements[index]) + padding - old_length
+        ends.append(old_offsets[index] + old_length)
+        deltas.append(delta)
+
+    # Jeden průchod daty
+    new_data = bytearray()
+    position = 0
+    for index in replaced:
+        buffer_view = buffer_views[index]
+        new_image_data = replacements[index]
+        new_data.extend(data[position:old_offsets[index]])
+        buffer_view.byteOffset = len(new_data)
+        new_data.extend(new_image_data)
+        new_data.extend(b"\0" * ((buffer_view.byteLength - len(new_image_data)) % 4))
+        position = old_offsets[index] + buffer_view.byteLength
+        buffer_view.byteLength = len(new_image_data)
+    new_data.extend(data[position:])
+
+    for index, buffer_view in buffer_views.items():
+        if index in replacements:
+            continue
+        i = bisect_right(ends, old_offsets[index])
+        if i > 0:
+            buffer_view.byteOffset = old_offsets[index] + deltas[i - 1]
 
-    return buffer_data
+    return new_data
 
 
-def update_buffer_data(gltf: GLTF2, buffer_data):
+def replace_buffer_views(gltf: GLTF2, replacements):
     """
-    Aktualizuje binární data bufferů v GLTF souboru.
+    Nahradí data zadaných bufferViews a přestaví dotčené buffery kompaktně (bez osiřelých dat).
 
-    :param gltf: GLTF objekt obsahující buffery.
-    :param buffer_data: List s binárními daty bufferů.
+    :param gltf: GLTF objekt.
+    :param replacements: Slovník index bufferView -> nová data.
     """
-    # Rozlišení mezi GLB a GLTF
-    if hasattr(gltf, '_glb_data') and gltf._glb_data is not None:
-        # Práce s `_glb_data`
-        gltf._glb_data = buffer_data[0]
-    else:
-        # Práce s více buffery v GLTF
-        for i, buffer in enumerate(gltf.buffers):
-            buffer.data = bytes(buffer_data[i])
+    by_buffer = {}
+    for buffer_view_index, new_data in replacements.items():
+        by_buffer.setdefault(gltf.bufferViews[buffer_view_index].buffer, {})[buffer_view_index] = new_data
+
+    for buffer_index, buffer_replacements in by_buffer.items():
+        buffer = gltf.buffers[buffer_index]
+        data = memoryview(get_buffer_bytes(gltf, buffer_index))
+        buffer_views = {index: buffer_view for index, buffer_view in enumerate(gltf.bufferViews) if buffer_view.buffer == buffer_index}
+
+        new_data = rebuild_buffer(data, buffer_views, buffer_replacements)
+        data.release()
+
+        # Rozlišení mezi GLB a GLTF
+        if buffer.uri is None:
+            gltf.set_binary_blob(new_data)
+        else:
+            buffer.uri = DATA_URI_HEADER + base64.b64encode(new_data).decode("utf-8")
+        buffer.byteLength = len(new_data)
 
 
 def convert_images_to_webp(gltf, min_size_kb=50):
@@ -44,9 +104,8 @@ def convert_images_to_webp(gltf, min_size_kb=50):
     :param gltf: GLTF objekt obsahující obrázky.
     :param min_size_kb: Minimální velikost obrázku (v kB) pro konverzi.
     """
-    # new_buffer_data = bytearray(gltf._glb_data)  # Vytvoření kopie původních binárních dat
-
     buffer_data = get_buffer_data(gltf)
+    replacements = {}
 
     for image in gltf.images:
         if image.mimeType == "image/webp":
@@ -74,20 +133,14 @@ def convert_images_to_webp(gltf, min_size_kb=50):
             img.save(output, format="WEBP", quality=85)
             output.seek(0)
 
-            # Aktualizace bufferu s novými daty
-            new_image_data = output.read()
-            new_offset = len(buffer_data[buffer_index])
-            buffer_data[buffer_index].extend(new_image_data)
-
-            # Aktualizace bufferView s novými daty
-            buffer_view.byteOffset = new_offset
-            buffer_view.byteLength = len(new_image_data)
+            # Nová data se zapíší na místo původního obrázku
+            replacements[image.bufferView] = output.read()
 
              # Aktualizace MIME typu na image/webp
             image.mimeType = "image/webp"
 
-    # Aktualizace GLB bufferů
-    update_buffer_data(gltf, buffer_data)
+    # Přestavba bufferů s novými daty
+    replace_buffer_views(gltf, replacements)
 
 
 def resize_images_in_gltf(gltf: GLTF2, max_width: float = 1024, max_height: float = 1024):
@@ -99,6 +152,7 @@ def resize_images_in_gltf(gltf: GLTF2, max_width: float = 1024, max_height: floa
     :param max_height: Maximální výška obrázku.
     """
     buffer_data = get_buffer_data(gltf)
+    replacements = {}
 
     for image in gltf.images:
         if image.bufferView is not None:
@@ -122,78 +176,271 @@ def resize_images_in_gltf(gltf: GLTF2, max_width: float = 1024, max_height: floa
                 img.save(output, format=img_format, quality=85)
                 output.seek(0)
 
-                # Aktualizace bufferu s novými daty
-                new_image_data = output.read()
-                new_offset = len(buffer_data[buffer_index])
-                buffer_data[buffer_index].extend(new_image_data)
+                # Nová data se zapíší na místo původního obrázku
+                replacements[image.bufferView] = output.read()
+
+    # Přestavba bufferů s novými daty
+    replace_buffer_views(gltf, replacements)
+
+
+class _MemoryViewFile(io.RawIOBase):
+    """
+    Souborový objekt pouze pro čtení nad memoryview - PIL čte přímo z bufferu bez kopie dat
+    (io.BytesIO by si data zkopíroval).
+    """
+
+    def __init__(self, view):
+        self._view = memoryview(view).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        size = max(0, min(len(target), len(self._view) - self._position))
+        target[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+@dataclass
+class ImageInfo:
+    """Údaje o obrázku zjištěné pouze z hlavičky."""
+    width: int
+    height: int
+    format: str
+    has_alpha: bool
+
+
+def probe_image(image_data):
+    """
+    Zjistí rozměry, formát a průhlednost obrázku jen z hlavičky, bez dekódování rastru.
+
+    :param image_data: Data obrázku (bytes nebo memoryview do bufferu).
+    :return: ImageInfo.
+    """
+    img = Image.open(_MemoryViewFile(image_data))
+    has_alpha = img.mode in ("RGBA", "LA", "PA", "RGBa", "La") or "transparency" in img.info
+    return ImageInfo(img.width, img.height, img.format, has_alpha)
+
+
+def _needs_processing(info: ImageInfo, mime_type, max_width, max_height):
+    doResize = info.width > max_width or info.height > max_height
+    return doResize or mime_type != "image/webp"
+
+
+@dataclass
+class TextureTier:
+    """Parametry jedné úrovně kvality textur (např. desktop, mobil, náhled)."""
+    suffix: str = ""
+    max_width: float = 1024
+    max_height: float = 1024
+    quality: int = 85
+
+
+def _tier_order(tiers):
+    # Pořadí zpracování úrovní - od největší k nejmenší (kaskádové zmenšování)
+    return sorted(range(len(tiers)), key=lambda i: tiers[i].max_width * tiers[i].max_height, reverse=True)
 
-                # Aktualizace bufferView s novými daty
-                buffer_view.byteOffset = new_offset
-                buffer_view.byteLength = len(new_image_data)
 
-    # Aktualizace GLB bufferů
-    update_buffer_data(gltf, buffer_data)
+def _tier_cache_formats(tiers, mime_type):
+    # Výstup úrovně závisí i na všech předchozích úrovních kaskády (draft podle největší úrovně,
+    # zmenšení z výsledku předchozí), jsou proto součástí klíče cache. Samostatná úroveň má
+    # stejný klíč jako kódování bez úrovní.
+    formats = [None] * len(tiers)
+    chain = ""
+    for i in _tier_order(tiers):
+        formats[i] = f"WEBP|{mime_type}{chain}"
+        chain += f"|{tiers[i].max_width}x{tiers[i].max_height}q{tiers[i].quality}"
+    return formats
 
 
-def process_images_in_gltf(gltf: GLTF2, max_width: float = 1024, max_height: float = 1024, min_size_kb: float = 50, quality: int = 85):
+def _encode_image_tiers(image_data, mime_type, tiers):
+    """
+    Dekóduje obrázek jednou a zakóduje ho do WebP pro všechny úrovně. Zmenšuje se kaskádově
+    od největší úrovně k nejmenší, každá úroveň vychází z výsledku předchozí.
+    Pro úrovně, kde obrázek není třeba zpracovat, vrací None.
+    """
+    # Načtení hlavičky obrázku pomocí PIL (rastr se zatím nedekóduje)
+    img = Image.open(_MemoryViewFile(image_data))
+
+    order = _tier_order(tiers)
+    results = [None] * len(tiers)
+
+    # JPEG se dekóduje rovnou ve zmenšeném měřítku (1/2, 1/4, 1/8) nejblíže největší úrovni
+    largest = tiers[order[0]]
+    if img.width > largest.max_width or img.height > largest.max_height:
+        img.draft(None, (int(largest.max_width), int(largest.max_height)))
+
+    resized = False
+    for i in order:
+        tier = tiers[i]
+        doResize = img.width > tier.max_width or img.height > tier.max_height
+
+        if not doResize and not resized and mime_type == "image/webp":
+            # pokud není třeba zmenšovat a obrázek je již ve formátu WebP, přeskočíme ho 
+            continue
+
+        # Změna velikosti obrázku, pokud přesahuje maximální rozměry
+        if doResize:
+            img.thumbnail((tier.max_width, tier.max_height))  # Zmenšení obrázku
+            resized = True
+
+        # Konverze obrázku do WebP
+        output = io.BytesIO()
+        img.save(output, format="WEBP", quality=tier.quality)
+        results[i] = output.getvalue()
+
+    return results
+
+
+def _encode_image(image_data, mime_type, max_width, max_height, quality):
+    """
+    Zmenší obrázek a zakóduje ho do WebP. Vrací None, pokud obrázek není třeba zpracovat.
+    Funkce pracuje jen s daty obrázku, aby ji bylo možné spouštět ve vláknech i v procesech.
+    """
+    return _encode_image_tiers(image_data, mime_type, [TextureTier("", max_width, max_height, quality)])[0]
+
+
+def _copy_gltf(gltf: GLTF2):
+    # Kopie JSON části, binární data se sdílí (přestavba bufferu vytváří nová data)
+    blob = gltf.binary_blob()
+    gltf.set_binary_blob(None)
+    try:
+        new_gltf = copy.deepcopy(gltf)
+    finally:
+        gltf.set_binary_blob(blob)
+    new_gltf.set_binary_blob(blob)
+    return new_gltf
+
+
+def process_images_in_gltf(gltf: GLTF2, max_width: float = 1024, max_height: float = 1024, min_size_kb: float = 50, quality: int = 85, workers: int = None, pool: str = "thread", cache: TextureCache = None, tiers = None):
     """
     Převádí obrázky v GLTF souboru na formát WebP a zmenšuje je na zadané maximální rozměry.
     Obrázky se zpracovávají pouze, pokud jejich velikost přesahuje zadaný práh (v kB).
 
+    Při workers > 1 se všechny obrázky kódují současně (PIL při kódování uvolňuje GIL)
+    a výsledky se do bufferu zapisují v pořadí obrázků, takže výstup je deterministický.
+
+    Se seznamem tiers se každý obrázek dekóduje jen jednou a zmenšuje se kaskádově pro všechny
+    úrovně. Vstupní objekt pak zůstane beze změny a vrátí se nový GLTF objekt pro každou úroveň.
+
     :param gltf: GLTF objekt obsahující obrázky.
     :param max_width: Maximální šířka obrázku.
     :param max_height: Maximální výška obrázku.
     :param min_size_kb: Minimální velikost obrázku (v kB) pro zpracování.
+    :param quality: Kvalita WebP komprese.
+    :param workers: Počet současně kódovaných obrázků (None nebo 1 = sériově).
+    :param pool: "thread" pro ThreadPoolExecutor, "process" pro ProcessPoolExecutor.
+    :param cache: Volitelný TextureCache - při zásahu se obrázek vůbec nedekóduje.
+    :param tiers: Volitelný seznam TextureTier (max_width, max_height a quality se pak nepoužijí).
+    :return: Bez tiers None, jinak seznam dvojic (TextureTier, GLTF objekt).
     """
+    single = tiers is None
+    if single:
+        tiers = [TextureTier("", max_width, max_height, quality)]
+
     buffer_data = get_buffer_data(gltf)
 
-    for image in gltf.images:
+    # Výběr obrázků ke zpracování
+    jobs = []
+    for image_index, image in enumerate(gltf.images):
         if image.bufferView is not None:
             buffer_view = gltf.bufferViews[image.bufferView]
             buffer_index = buffer_view.buffer
             start = buffer_view.byteOffset or 0
             end = start + buffer_view.byteLength
 
-
             # Podmínka pro minimální velikost obrázku
             if buffer_view.byteLength < min_size_kb * 1024:
                 # pokud je obrázek menší než daný práh, přeskočíme ho
                 continue
 
-            image_data = io.BytesIO(buffer_data[buffer_index][start:end])
-
-            # Načtení obrázku pomocí PIL
-            img = Image.open(image_data)
-
-            doResize = img.width > max_width or img.height > max_height
+            image_data = buffer_data[buffer_index][start:end]
 
-            if not doResize and image.mimeType == "image/webp":
-                # pokud není třeba zmenšovat a obrázek je již ve formátu WebP, přeskočíme ho 
+            # Obrázky, které není třeba zpracovat, se přeskočí jen podle hlavičky
+            info = probe_image(image_data)
+            if not any(_needs_processing(info, image.mimeType, tier.max_width, tier.max_height) for tier in tiers):
                 continue
 
-            # Změna velikosti obrázku, pokud přesahuje maximální rozměry
-            if doResize:
-                img.thumbnail((max_width, max_height))  # Zmenšení obrázku
+            # Do procesů se předávají bajty, vlákna čtou přímo z bufferu (memoryview)
+            if pool == "process" and workers is not None and workers > 1:
+                image_data = bytes(image_data)
+
+            jobs.append((image_index, image.mimeType, image_data))
+
+    # Výsledky z cache, kódovat se budou jen obrázky, které v cache nejsou pro některou úroveň
+    encoded = [[None] * len(tiers) for _ in jobs]
+    keys = [None] * len(jobs)
+    missing = []
+    for i, (_, mime_type, data) in enumerate(jobs):
+        if cache is not None:
+            # MIME typ je součástí klíče, protože rozhoduje o přeskočení WebP obrázků
+            keys[i] = [cache.key(data, tier.max_width, tier.max_height, tier.quality, cache_format) for tier, cache_format in zip(tiers, _tier_cache_formats(tiers, mime_type))]
+            cached = [cache.get(key) for key in keys[i]]
+            if all(item is not None for item in cached):
+                encoded[i] = [item or None for item in cached]
+                continue
+        missing.append(i)
 
-            # Konverze obrázku do WebP
-            output = io.BytesIO()
-            img.save(output, format="WEBP", quality=quality)
-            output.seek(0)
+    arguments = (
+        [jobs[i][2] for i in missing],
+        [jobs[i][1] for i in missing],
+        [tiers] * len(missing),
+    )
 
-            # Aktualizace bufferu s novými daty
-            new_image_data = output.read()
-            new_offset = len(buffer_data[buffer_index])
-            buffer_data[buffer_index].extend(new_image_data)
+    # Kódování obrázků (map zachovává pořadí výsledků)
+    if workers is None or workers <= 1 or len(missing) <= 1:
+        results = map(_encode_image_tiers, *arguments)
+    else:
+        executor_class = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+        with executor_class(max_workers=workers) as executor:
+            results = list(executor.map(_encode_image_tiers, *arguments))
+
+    for i, tier_results in zip(missing, results):
+        encoded[i] = tier_results
+        if cache is not None:
+            for key, new_image_data in zip(keys[i], tier_results):
+                cache.put(key, new_image_data)
+
+    # Bez úrovní se mění přímo vstupní objekt
+    targets = [gltf] if single else [_copy_gltf(gltf) for _ in tiers]
+
+    for tier_index, target in enumerate(targets):
+        replacements = {}
+        for (image_index, _, _), tier_results in zip(jobs, encoded):
+            new_image_data = tier_results[tier_index]
+            if new_image_data is None:
+                continue
 
-            # Aktualizace bufferView s novými daty
-            buffer_view.byteOffset = new_offset
-            buffer_view.byteLength = len(new_image_data)
+            # Nová data se zapíší na místo původního obrázku
+            image = target.images[image_index]
+            replacements[image.bufferView] = new_image_data
 
             # Aktualizace MIME typu na image/webp
             image.mimeType = "image/webp"
 
-    # Aktualizace GLB dat
-    update_buffer_data(gltf, buffer_data)
+        # Přestavba bufferů s novými daty
+        replace_buffer_views(target, replacements)
+
+    if single:
+        return None
+
+    return list(zip(tiers, targets))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+import hashlib
+import os
+
+
+class TextureCache:
+    """
+    Diskový cache zakódovaných textur adresovaný obsahem.
+
+    Klíčem je hash zdrojových bajtů obrázku a parametrů kódování (max_width, max_height,
+    quality, format). Při zásahu se vrací hotový WebP bez dekódování zdroje. Velikost cache
+    je omezená, při překročení se mažou nejdéle nepoužité položky (LRU podle času změny
+    souboru, který se při každém zásahu obnoví).
+
+    Prázdný soubor znamená, že obrázek nebylo třeba překódovat (např. už je ve WebP).
+    Instance obsahuje jen cestu a limit, lze ji tedy předávat do podřízených procesů.
+    """
+
+    def __init__(self, directory, max_size_mb: float = 1024):
+        self.directory = directory
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # Průběžná velikost se v jiném procesu počítá znovu
+        state = self.__dict__.copy()
+        state["_size"] = None
+        return state
+
+    @staticmethod
+    def key(image_data, max_width, max_height, quality, format = "WEBP"):
+        """
+        Vrátí klíč položky z bajtů zdrojového obrázku a parametrů kódování.
+        """
+        digest = hashlib.sha256(image_data)
+        digest.update(f"|{max_width}|{max_height}|{quality}|{format}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def get(self, key):
+        """
+        Vrátí uložená data (b"" pokud obrázek nebylo třeba kódovat), nebo None při minutí.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        # Obnovení času posledního použití pro LRU
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return data
+
+    def put(self, key, data):
+        """
+        Uloží data do cache (None se ukládá jako prázdný soubor) a případně uvolní místo.
+        """
+        data = data or b""
+        path = self._path(key)
+
+        # Zápis přes dočasný soubor, aby souběžné procesy nikdy nečetly nekompletní data
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += len(data)
+
+        if self._size > self.max_size:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".bin"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, target_ratio: float = 0.9):
+        """
+        Smaže nejdéle nepoužité položky, dokud velikost cache neklesne pod target_ratio limitu.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        size = sum(entry_size for _, entry_size, _ in entries)
+        target = self.max_size * target_ratio
+
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+        self._size = size
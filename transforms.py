@@ -0,0 +1,213 @@
+from pygltflib import GLTF2, Node
+import numpy as np
+
+def quaternions_to_matrices(quaternions):
+    """
+    Převede kvaterniony (x, y, z, w) na rotační matice 3x3 najednou.
+
+    :param quaternions: Pole tvaru (n, 4). Kvaterniony se normalizují, nulový = bez rotace.
+    :return: Pole tvaru (n, 3, 3).
+    """
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    norm = np.linalg.norm(q, axis=1, keepdims=True)
+    q = np.where(norm > 0, q / np.where(norm > 0, norm, 1), [0, 0, 0, 1])
+    x, y, z, w = q.T
+
+    matrices = np.empty((len(q), 3, 3))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+def trs_to_matrices(translations, rotations, scales):
+    """
+    Sestaví transformační matice T * R * S (pořadí podle glTF) pro pole hodnot najednou.
+
+    :param translations: Pole tvaru (n, 3).
+    :param rotations: Pole kvaternionů tvaru (n, 4).
+    :param scales: Pole tvaru (n, 3).
+    :return: Pole tvaru (n, 4, 4).
+    """
+    translations = np.asarray(translations, dtype=np.float64).reshape(-1, 3)
+    scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3)
+
+    matrices = np.zeros((len(translations), 4, 4))
+    matrices[:, :3, :3] = quaternions_to_matrices(rotations) * scales[:, np.newaxis, :]
+    matrices[:, :3, 3] = translations
+    matrices[:, 3, 3] = 1
+    return matrices
+
+def matrices_to_quaternions(matrices):
+    """
+    Převede rotační matice 3x3 na kvaterniony (x, y, z, w) najednou.
+
+    :param matrices: Pole tvaru (n, 3, 3) s ortonormálními maticemi.
+    :return: Pole tvaru (n, 4) s normalizovanými kvaterniony (w >= 0).
+    """
+    m = np.asarray(matrices, dtype=np.float64).reshape(-1, 3, 3)
+    m00, m11, m22 = m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]
+
+    # Pro numerickou stabilitu se vychází z největší složky kvaternionu
+    candidates = np.stack([
+        np.stack([1 + m00 - m11 - m22, m[:, 0, 1] + m[:, 1, 0], m[:, 0, 2] + m[:, 2, 0], m[:, 2, 1] - m[:, 1, 2]], axis=1),
+        np.stack([m[:, 0, 1] + m[:, 1, 0], 1 - m00 + m11 - m22, m[:, 1, 2] + m[:, 2, 1], m[:, 0, 2] - m[:, 2, 0]], axis=1),
+        np.stack([m[:, 0, 2] + m[:, 2, 0], m[:, 1, 2] + m[:, 2, 1], 1 - m00 - m11 + m22, m[:, 1, 0] - m[:, 0, 1]], axis=1),
+        np.stack([m[:, 2, 1] - m[:, 1, 2], m[:, 0, 2] - m[:, 2, 0], m[:, 1, 0] - m[:, 0, 1], 1 + m00 + m11 + m22], axis=1),
+    ], axis=1)
+    diagonal = np.stack([m00, m11, m22], axis=1)
+    largest = np.where(m00 + m11 + m22 > diagonal.max(axis=1), 3, diagonal.argmax(axis=1))
+
+    quaternions = candidates[np.arange(len(m)), largest]
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    return np.where(quaternions[:, 3:] < 0, -quaternions, quaternions)
+
+def matrices_to_trs(matrices, tolerance = 1e-5):
+    """
+    Rozloží transformační matice na translation, rotation a scale najednou (inverze trs_to_matrices).
+
+    Zrcadlení (záporný determinant) se vyjádří záporným měřítkem v ose x. Matice se zkosením
+    nebo projekcí nelze přesně rozložit - označí je výsledek valid.
+
+    :param matrices: Pole tvaru (n, 4, 4).
+    :param tolerance: Povolená odchylka rotační části od ortonormální matice.
+    :return: Dvojice ((translations (n, 3), rotations (n, 4), scales (n, 3)), valid (n,)).
+    """
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+    linear = matrices[:, :3, :3]
+
+    translations = matrices[:, :3, 3].copy()
+    scales = np.linalg.norm(linear, axis=1)
+    scales[:, 0] *= np.where(np.linalg.det(linear) < 0, -1, 1)
+
+    valid = (np.abs(scales) > 1e-12).all(axis=1)
+    rotations = linear / np.where(valid[:, np.newaxis], scales, 1)[:, np.newaxis, :]
+
+    identity = np.matmul(rotations.transpose(0, 2, 1), rotations)
+    valid &= np.abs(identity - np.eye(3)).max(axis=(1, 2)) <= tolerance
+    valid &= np.abs(matrices[:, 3] - [0, 0, 0, 1]).max(axis=1) <= tolerance
+
+    rotations = np.where(valid[:, np.newaxis, np.newaxis], rotations, np.eye(3))
+    return (translations, matrices_to_quaternions(rotations), scales), valid
+
+def trs_to_matrix(translation = None, rotation = None, scale = None):
+    """Převede translation, rotation, scale na transformační matici 4x4 (T * R * S)."""
+    return trs_to_matrices(
+        translation if translation is not None else [0, 0, 0],
+        rotation if rotation is not None else [0, 0, 0, 1],
+        scale if scale is not None else [1, 1, 1],
+    )[0]
+
+def node_matrix(node: Node):
+    """Vrátí lokální transformační matici uzlu 4x4 (matrix nebo TRS)."""
+    if node.matrix:
+        return np.array(node.matrix, dtype=np.float64).reshape(4, 4).T
+    return trs_to_matrix(node.translation, node.rotation, node.scale)
+
+def matrix_to_list(matrix):
+    """Převede matici 4x4 na seznam hodnot po sloupcích (formát node.matrix)."""
+    return np.transpose(matrix).flatten().tolist()
+
+def local_matrices(gltf: GLTF2):
+    """
+    Vypočte lokální transformační matice všech uzlů najednou.
+
+    :return: Pole tvaru (počet uzlů, 4, 4).
+    """
+    count = len(gltf.nodes)
+    translations = np.zeros((count, 3))
+    rotations = np.tile([0.0, 0.0, 0.0, 1.0], (count, 1))
+    scales = np.ones((count, 3))
+    matrix_nodes = []
+
+    for node_index, node in enumerate(gltf.nodes):
+        if node.matrix:
+            matrix_nodes.append(node_index)
+            continue
+        if node.translation is not None:
+            translations[node_index] = node.translation
+        if node.rotation is not None:
+            rotations[node_index] = node.rotation
+        if node.scale is not None:
+            scales[node_index] = node.scale
+
+    matrices = trs_to_matrices(translations, rotations, scales)
+    if matrix_nodes:
+        matrices[matrix_nodes] = np.array([gltf.nodes[i].matrix for i in matrix_nodes], dtype=np.float64).reshape(-1, 4, 4).transpose(0, 2, 1)
+    return matrices
+
+def _transform_signature(gltf: GLTF2):
+    # Otisk hierarchie a transformací - změna kteréhokoli uzlu zneplatní cache
+    return hash(tuple(
+        (
+            tuple(node.matrix) if node.matrix else None,
+            tuple(node.translation) if node.translation is not None else None,
+            tuple(node.rotation) if node.rotation is not None else None,
+            tuple(node.scale) if node.scale is not None else None,
+            tuple(node.children),
+        )
+        for node in gltf.nodes
+    ))
+
+def get_world_matrices(gltf: GLTF2):
+    """
+    Vrátí světové transformační matice všech uzlů.
+
+    Lokální matice se spočtou najednou a světové se skládají po úrovních hierarchie
+    (jedno dávkové násobení matic pro každou úroveň). Výsledek se ukládá na GLTF objekt
+    a znovu se počítá jen tehdy, když se změní transformace nebo hierarchie uzlů.
+
+    :param gltf: GLTF objekt.
+    :return: Pole tvaru (počet uzlů, 4, 4) pouze pro čtení. Uzly bez rodiče mají lokální matici.
+    """
+    signature = _transform_signature(gltf)
+    cached = getattr(gltf, "_world_matrices", None)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    local = local_matrices(gltf)
+    world = local.copy()
+
+    parents = np.full(len(gltf.nodes), -1)
+    for node_index, node in enumerate(gltf.nodes):
+        parents[node.children] = node_index
+
+    # Průchod po úrovních od kořenů; počet úrovní je omezený počtem uzlů (ochrana proti cyklům)
+    level = np.flatnonzero(parents == -1)
+    for _ in range(len(gltf.nodes)):
+        level = np.array([child for node_index in level for child in gltf.nodes[node_index].children], dtype=np.int64)
+        if len(level) == 0:
+            break
+        world[level] = np.matmul(world[parents[level]], local[level])
+
+    world.flags.writeable = False
+    setattr(gltf, "_world_matrices", (signature, world))
+
+    return world
+
+def invalidate_world_matrices(gltf: GLTF2):
+    """Zahodí uložené světové matice (např. po změně uzlů mimo jejich transformace)."""
+    setattr(gltf, "_world_matrices", None)
+
+def get_scene_nodes(gltf: GLTF2, scene_index = None):
+    """
+    Vrátí indexy všech uzlů dosažitelných ze scény.
+
+    :param gltf: GLTF objekt.
+    :param scene_index: Index scény (výchozí gltf.scene, případně 0).
+    :return: Seznam indexů uzlů.
+    """
+    if scene_index is None:
+        scene_index = gltf.scene or 0
+    nodes = []
+    stack = list(gltf.scenes[scene_index].nodes)
+    while stack:
+        node_index = stack.pop()
+        nodes.append(node_index)
+        stack.extend(gltf.nodes[node_index].children)
+    return nodes
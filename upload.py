@@ -0,0 +1,131 @@
+# pip install azure-storage-blob aiohttp
+import asyncio
+import hashlib
+import mimetypes
+import os
+import sys
+
+from addContentDisposition import FOLDER_PATH, MAX_CONCURRENCY, create_container_client, get_content_disposition, with_retry
+
+# Přípony nahrávaných souborů výstupní složky
+UPLOAD_SUFFIXES = (".glb", ".png", "_size.txt")
+
+# Typy obsahu, které mimetypes nemusí znát
+CONTENT_TYPES = {
+    ".glb": "model/gltf-binary",
+    ".gltf": "model/gltf+json",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+# Počet souběžně nahrávaných bloků jednoho souboru
+MAX_CHUNK_CONCURRENCY = 4
+
+def get_content_type(path):
+    """
+    Vrátí Content-Type podle přípony souboru.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+def make_content_settings(**kwargs):
+    """
+    Vytvoří azure.storage.blob.ContentSettings.
+    """
+    from azure.storage.blob import ContentSettings
+    return ContentSettings(**kwargs)
+
+def file_md5(path, chunk_size = 1024 * 1024):
+    """
+    Vrátí MD5 obsahu souboru (bajty, stejný formát jako content_md5 blobu).
+    """
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+def _local_files(folder, suffixes):
+    # Soubory složky (rekurzivně) s názvem blobu relativním ke složce
+    for root, _, files in os.walk(folder):
+        for file_name in sorted(files):
+            if file_name.endswith(suffixes):
+                path = os.path.join(root, file_name)
+                yield path, os.path.relpath(path, folder).replace(os.sep, "/")
+
+async def upload_folder(folder, container_client = None, prefix = FOLDER_PATH, suffixes = UPLOAD_SUFFIXES, max_concurrency = MAX_CONCURRENCY, max_chunk_concurrency = MAX_CHUNK_CONCURRENCY):
+    """
+    Nahraje výstupní složku pipeline do kontejneru.
+
+    Content-Type, Content-Disposition a Content-MD5 se nastaví už při nahrání (není potřeba
+    dodatečný průchod addContentDisposition). Soubory, jejichž MD5 odpovídá content_md5 blobu
+    z výpisu kontejneru, se přeskočí. Soubory se nahrávají souběžně (max_concurrency) a velké
+    soubory navíc po blocích (max_chunk_concurrency). Přechodné chyby se opakují (with_retry).
+
+    :param folder: Lokální složka (např. výstup script.py).
+    :param container_client: Asynchronní klient kontejneru (výchozí create_container_client()).
+                             Lze předat klienta pro emulátor Azurite nebo testovací náhradu.
+    :param prefix: Prefix názvů blobů.
+    :param suffixes: Přípony nahrávaných souborů.
+    :param max_concurrency: Maximální počet souběžně nahrávaných souborů.
+    :param max_chunk_concurrency: Počet souběžně nahrávaných bloků jednoho souboru.
+    :return: Slovník s počty nahraných, přeskočených a chybných souborů.
+    """
+    own_client = container_client is None
+    if own_client:
+        container_client = create_container_client()
+
+    stats = {"uploaded": 0, "skipped": 0, "failed": 0}
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def upload(path, blob_name, remote_md5):
+        async with semaphore:
+            try:
+                # Hashování v samostatném vlákně, aby neblokovalo ostatní přenosy
+                md5 = await asyncio.to_thread(file_md5, path)
+                if remote_md5 is not None and bytes(remote_md5) == md5:
+                    stats["skipped"] += 1
+                    return
+
+                content_settings = make_content_settings(
+                    content_type=get_content_type(path),
+                    content_disposition=get_content_disposition(blob_name),
+                    content_md5=bytearray(md5),
+                )
+                blob_client = container_client.get_blob_client(blob_name)
+
+                async def send():
+                    with open(path, "rb") as f:
+                        await blob_client.upload_blob(f, overwrite=True, content_settings=content_settings, max_concurrency=max_chunk_concurrency)
+
+                await with_retry(send)
+                stats["uploaded"] += 1
+                print(f"Uploaded: {blob_name}")
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"An error occurred for {path}: {e}")
+
+    try:
+        # MD5 existujících blobů z jednoho výpisu (bez dotazu na každý blob)
+        remote = {}
+        async for blob in container_client.list_blobs(name_starts_with=prefix):
+            remote[blob.name] = blob.content_settings.content_md5
+
+        await asyncio.gather(*[
+            upload(path, prefix + relative_name, remote.get(prefix + relative_name))
+            for path, relative_name in _local_files(folder, suffixes)
+        ])
+    finally:
+        if own_client:
+            await container_client.close()
+
+    print(f"Upload: uploaded {stats['uploaded']}, skipped {stats['skipped']}, failed {stats['failed']}.")
+
+    return stats
+
+if __name__ == "__main__":
+
+    folder = (len(sys.argv) > 1 and sys.argv[1]) or os.path.join("..", "output")
+
+    asyncio.run(upload_folder(folder))